@@ -16,9 +16,5 @@ def check_files(destination_dir):  # path to the destination folder where to sav
         True if there are all objects are present, False otherwise.
     """
 
-    # select just the objects not already present from the needed objects
-    absent_objects = {key: obj for key, obj in needed_objects.items()
-                      if not os.path.exists(os.path.join(destination_dir, obj))}
-
-    # if there are no objects to download return true
-    return len(absent_objects) == 0
+    # return true if all the needed objects are present (stopping at the first missing one)
+    return all(os.path.exists(os.path.join(destination_dir, obj)) for obj in needed_objects.values())
@@ -5,7 +5,8 @@ import mlflow  # open source platform for managing the end-to-end machine learni
 import requests  # simple HTTP library for Python
 from logzero import logger  # robust and effective logging for Python
 
-from utils.download_utils import BucketFileDownloader, check_files, needed_objects, missing_url
+from utils.dataset_utils import needed_objects
+from utils.download_utils import BucketFileDownloader, missing_url
 
 
 @baker.command
@@ -31,8 +32,12 @@ def sorel20m_download(destination_dir):  # path to the destination folder where
         # log dataset base path
         mlflow.log_text(dataset_base_path, artifact_file="dataset_base_path.txt")
 
+        # select just the objects not already present from needed objects
+        objects_to_download = {key: obj for key, obj in needed_objects.items()
+                               if not os.path.exists(os.path.join(destination_dir, obj))}
+
         # check if all the needed files were already downloaded, if yes return
-        if check_files(destination_dir=destination_dir):
+        if len(objects_to_download) == 0:
             logger.info("Found already downloaded dataset..")
             return
 
@@ -42,10 +47,6 @@ def sorel20m_download(destination_dir):  # path to the destination folder where
         # instantiate bucket file downloader setting the destination dir and bucket name
         downloader = BucketFileDownloader(destination_dir, bucket_name)
 
-        # select just the objects not already present from needed objects
-        objects_to_download = {key: obj for key, obj in needed_objects.items()
-                               if not os.path.exists(os.path.join(destination_dir, obj))}
-
         # for all objects to download
         for i, (key, obj) in enumerate(objects_to_download.items()):
             if key == 'missing':
@@ -0,0 +1,20 @@
+import os  # provides a portable way of using operating system dependent functionality
+
+# dataset objects to be downloaded
+needed_objects = {"meta": "09-DEC-2020/processed-data/meta.db",
+                  "lock": "09-DEC-2020/processed-data/ember_features/lock.mdb",
+                  "data": "09-DEC-2020/processed-data/ember_features/data.mdb",
+                  "missing": "09-DEC-2020/processed-data/shas_missing_ember_features.json"}
+
+
+def check_files(destination_dir):  # path to the folder where to search for the needed files
+    """ Check if the dataset needed files are already present inside the specified directory.
+
+    Args:
+        destination_dir: Path to the folder where to search for the needed files
+    Returns:
+        True if there are no objects to download, False otherwise.
+    """
+
+    # return true if all the needed objects are present (stopping at the first missing one)
+    return all(os.path.exists(os.path.join(destination_dir, obj)) for obj in needed_objects.values())
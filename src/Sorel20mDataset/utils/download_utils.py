@@ -1,18 +1,25 @@
+import hashlib  # implements a common interface to many different secure hash and message digest algorithms
 import os  # provides a portable way of using operating system dependent functionality
 import threading  # constructs higher-level threading interfaces on top of the lower level _thread module
-from pathlib import Path  # provide path-handling operations which don’t actually access a filesystem
 
 import boto3  # used to create, configure, and manage AWS services (s3 included)
 from tqdm import tqdm  # instantly makes loops show a smart progress meter
+from boto3.s3.transfer import create_transfer_manager, ProgressCallbackInvoker, TransferConfig  # s3 transfer utils
 from botocore import UNSIGNED  # constant to use to connect to s3 bucket anonymously (botocore is the core of boto 3)
 from botocore.client import Config  # advanced configuration for Botocore clients (botocore is the core of boto 3)
+from botocore.exceptions import BotoCoreError  # base class for all botocore (connection, timeout, ..) errors
 from logzero import logger  # robust and effective logging for Python
+from s3transfer.exceptions import RetriesExceededError  # raised when the s3 transfer retries are exhausted
+from s3transfer.subscribers import BaseSubscriber  # base class for s3 transfer future subscribers
+from urllib3.exceptions import ProtocolError  # raised when a connection is dropped while reading a response body
 
-# dataset objects to be downloaded
-needed_objects = {"meta": "09-DEC-2020/processed-data/meta.db",
-                  "lock": "09-DEC-2020/processed-data/ember_features/lock.mdb",
-                  "data": "09-DEC-2020/processed-data/ember_features/data.mdb",
-                  "missing": "09-DEC-2020/processed-data/shas_missing_ember_features.json"}
+# s3 transfer settings: number of concurrent ranged GET requests and size of each of them
+MB = 1024 ** 2
+max_concurrency = 20
+multipart_chunksize = 16 * MB
+
+# network errors which may be raised while transferring an object (the download attempt is retried when they occur)
+network_errors = (BotoCoreError, RetriesExceededError, ProtocolError, OSError)
 
 # shas missing ember features json file url
 missing_url = 'https://raw.githubusercontent.com/sophos-ai/SOREL-20M/master/shas_missing_ember_features.json'
@@ -47,29 +54,201 @@ class ProgressPercentage(object):
             self.pbar.update(bytes_amount)
 
 
+class ProvideSizeSubscriber(BaseSubscriber):
+    """ Transfer subscriber used to provide the (already known) object size to the s3 transfer manager. """
+
+    def __init__(self,
+                 size):  # total size (in bytes) of the object to transfer
+        """ Init subscriber.
+
+        Args:
+            size: Total size (in bytes) of the object to transfer
+        """
+
+        # set size attribute
+        self.size = size
+
+    def on_queued(self,
+                  future,  # transfer future associated with the queued transfer
+                  **kwargs):  # additional keyword arguments
+        """ Provide transfer size to the transfer future as soon as the transfer is queued.
+        -> this way the transfer manager does not need to issue its own HeadObject request.
+
+        Args:
+            future: Transfer future associated with the queued transfer
+            kwargs: Additional keyword arguments
+        """
+
+        # provide object size to the transfer future metadata
+        future.meta.provide_transfer_size(self.size)
+
+
+class HashingWriter(object):
+    """ File-like writer which updates a hash with each chunk of data written to the underlying file. """
+
+    def __init__(self,
+                 fileobj,  # already opened (binary mode) file object to write the data to
+                 check_md5=True):  # whether the md5 of the data will be checked or not (default: True)
+        """ Init hashing writer.
+
+        Args:
+            fileobj: Already opened (binary mode) file object to write the data to
+            check_md5: Whether the md5 of the data will be checked or not (default: True)
+        """
+
+        # set some attributes
+        self._fileobj = fileobj
+        # instantiate md5 hash object (the same digest used by s3 single part etags) only if it is going to be checked
+        self.md5 = hashlib.md5() if check_md5 else None
+        self.bytes_written = 0
+
+    def write(self,
+              data):  # chunk of bytes to write
+        """ Write data chunk to file while updating the hash and the amount of bytes written.
+
+        Args:
+            data: Chunk of bytes to write
+        Returns:
+            Number of bytes written.
+        """
+
+        # update hash (if needed) and written bytes counter with the current chunk
+        if self.md5 is not None:
+            self.md5.update(data)
+        self.bytes_written += len(data)
+
+        # write chunk to the underlying file
+        return self._fileobj.write(data)
+
+    def update_from_file(self,
+                         path):  # path of the file containing the data already written (e.g. by a previous download)
+        """ Update the hash and the amount of bytes written with the content of an already written file.
+
+        Args:
+            path: Path of the file containing the data already written (e.g. by a previous download)
+        """
+
+        # update written bytes counter with the file size
+        self.bytes_written += os.path.getsize(path)
+
+        # if the md5 is needed, update the hash with the file content, chunk by chunk
+        if self.md5 is not None:
+            with open(path, 'rb') as written_file:
+                for chunk in iter(lambda: written_file.read(multipart_chunksize), b''):
+                    self.md5.update(chunk)
+
+
 class BucketFileDownloader(object):
     """ Class used to download bucket files from an s3 bucket. """
 
     def __init__(self,
                  destination_dir,  # path to the folder where to save the element to
-                 bucket_name):  # name of the s3 bucket where to find the elements to download
+                 bucket_name,  # name of the s3 bucket where to find the elements to download
+                 max_attempts=3):  # maximum number of download attempts for each object
         """ Init bucket file downloader.
 
         Args:
             destination_dir: Path to the folder where to save the element to
             bucket_name: Name of the s3 bucket where to find the elements to download
+            max_attempts: Maximum number of download attempts for each object (default: 3)
         """
 
-        # set some attributes
-        self._destination_dir = destination_dir
+        # set some attributes (resolving the destination dir absolute path once)
+        self._destination_dir = os.path.abspath(destination_dir)
         self._bucketName = bucket_name
+        self._max_attempts = max_attempts
+
+        # open boto3 client connection to the s3 bucket in anonymous mode (with a connection pool big enough to
+        # serve all the concurrent ranged requests)
+        self._s3client = boto3.client('s3', config=Config(signature_version=UNSIGNED,
+                                                          max_pool_connections=max_concurrency))
+
+        # instantiate s3 transfer config
+        self._transfer_config = TransferConfig(multipart_chunksize=multipart_chunksize,
+                                               max_concurrency=max_concurrency)
+
+    def _download(self,
+                  object_name,  # name (relative path wrt the s3 bucket) of the object to download
+                  dest_path,  # path where to save the object to
+                  size,  # total size (in bytes) of the object
+                  check_md5,  # whether the object md5 will be checked or not
+                  pbar):  # already initialized tqdm progress bar
+        """ Download whole object from s3 bucket using concurrent ranged requests.
+
+        Args:
+            object_name: Name (relative path wrt the s3 bucket) of the object to download
+            dest_path: Path where to save the object to
+            size: Total size (in bytes) of the object
+            check_md5: Whether the object md5 will be checked or not
+            pbar: Already initialized tqdm progress bar
+        Returns:
+            Hashing writer used to write the object to file.
+        """
+
+        # open destination file in binary write mode
+        with open(dest_path, 'wb') as dest_file:
+            # wrap destination file with a hashing writer so that the object is verified while downloading it
+            writer = HashingWriter(dest_file, check_md5)
 
-        # open boto3 client connection to the s3 bucket in anonymous mode
-        self._s3client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+            # instantiate s3 transfer manager
+            with create_transfer_manager(self._s3client, self._transfer_config) as manager:
+                # download object while providing it the already retrieved object size and the ProgressPercentage
+                # as progress callback -> its call method will be called intermittently passing it the amount of
+                # bytes received
+                future = manager.download(self._bucketName,
+                                          object_name,
+                                          writer,
+                                          subscribers=[ProvideSizeSubscriber(size),
+                                                       ProgressCallbackInvoker(ProgressPercentage(pbar))])
+                # wait for the download to complete
+                future.result()
+
+        # return hashing writer
+        return writer
+
+    def _resume(self,
+                object_name,  # name (relative path wrt the s3 bucket) of the object to download
+                dest_path,  # path of the partially downloaded object
+                start,  # amount of bytes already downloaded
+                check_md5,  # whether the object md5 will be checked or not
+                pbar):  # already initialized tqdm progress bar
+        """ Resume partial object download from s3 bucket requesting just the missing bytes range.
+
+        Args:
+            object_name: Name (relative path wrt the s3 bucket) of the object to download
+            dest_path: Path of the partially downloaded object
+            start: Amount of bytes already downloaded
+            check_md5: Whether the object md5 will be checked or not
+            pbar: Already initialized tqdm progress bar
+        Returns:
+            Hashing writer used to write the object to file.
+        """
+
+        logger.info("Resuming download of {} from byte {}..".format(object_name, start))
+
+        # open destination file in binary append mode
+        with open(dest_path, 'ab') as dest_file:
+            # wrap destination file with a hashing writer so that the object is verified while downloading it
+            writer = HashingWriter(dest_file, check_md5)
+            # update the writer with the already downloaded part of the object
+            writer.update_from_file(dest_path)
+
+            # retrieve just the missing bytes range of the object
+            response = self._s3client.get_object(Bucket=self._bucketName,
+                                                 Key=object_name,
+                                                 Range='bytes={}-'.format(start))
+
+            # write the missing part of the object to file, chunk by chunk
+            for chunk in response['Body'].iter_chunks(multipart_chunksize):
+                writer.write(chunk)
+                pbar.update(len(chunk))
+
+        # return hashing writer
+        return writer
 
     def __call__(self,
                  object_name):  # name (relative path wrt the s3 bucket) of the object to download
-        """ Download single object from s3 bucket.
+        """ Download single object from s3 bucket (resuming previously interrupted downloads).
 
         Args:
             object_name: Name (relative path wrt the s3 bucket) of the object to download
@@ -79,7 +258,11 @@ class BucketFileDownloader(object):
         dest_path = os.path.join(self._destination_dir, object_name)
 
         # create parent directory path if it does not exist (it succeeds even if the directory already exists)
-        os.makedirs(Path(dest_path).parent.absolute(), exist_ok=True)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        # set path of the partially downloaded object (renamed to dest_path only once the download is verified, so that
+        # interrupted downloads can be resumed and are never mistaken for complete objects)
+        part_path = dest_path + '.part'
 
         logger.info("Now downloading {} from s3 bucket..".format(object_name))
 
@@ -87,32 +270,54 @@ class BucketFileDownloader(object):
         response = self._s3client.head_object(Bucket=self._bucketName,
                                               Key=object_name)
 
-        # extract total object size info from the response header
+        # extract total object size and etag info from the response header
         size = response['ContentLength']
+        etag = response['ETag'].strip('"')
+
+        # the etag is the md5 of the object content only for single part objects (multipart etags contain a '-')
+        check_md5 = '-' not in etag
+
+        for attempt in range(self._max_attempts):
+            # get the amount of bytes of the object already present on disk (left by a previous interrupted download)
+            start = os.path.getsize(part_path) if os.path.exists(part_path) else 0
 
-        # instantiate tqdm progress bar
-        with tqdm(total=size) as pbar:
-            # download object file using boto3 'download_file' method
-            # while passing it the ProgressPercentage as callback function
-            # -> its call method will be called intermittently passing it the amount of bytes received
-            self._s3client.download_file(self._bucketName,
-                                         object_name,
-                                         dest_path,
-                                         Callback=ProgressPercentage(pbar))
+            # if the object was completely downloaded (but not verified yet) by a previous interrupted download, just
+            # verify it without downloading it again
+            if start == size:
+                writer = HashingWriter(None, check_md5)
+                writer.update_from_file(part_path)
+            else:
+                try:
+                    # instantiate tqdm progress bar
+                    with tqdm(total=size, initial=start if 0 < start < size else 0) as pbar:
+                        # if the object was partially downloaded, resume its download; otherwise download it from
+                        # scratch
+                        if 0 < start < size:
+                            writer = self._resume(object_name, part_path, start, check_md5, pbar)
+                        else:
+                            writer = self._download(object_name, part_path, size, check_md5, pbar)
+                except network_errors as e:
+                    logger.warning("Download of object {} failed: {} (attempt {}/{}).".format(object_name,
+                                                                                              e,
+                                                                                              attempt + 1,
+                                                                                              self._max_attempts))
 
+                    # keep the partially downloaded object so that the next attempt resumes its download
+                    continue
 
-def check_files(destination_dir):  # path to the folder where to search for the needed files
-    """ Check if the dataset needed files are already present inside the specified directory.
+            # if the downloaded object has the expected size and (for single part objects) the expected md5,
+            # the download succeeded
+            if writer.bytes_written == size and (not check_md5 or writer.md5.hexdigest() == etag):
+                # move the downloaded object to its final destination path
+                os.replace(part_path, dest_path)
+                return
 
-    Args:
-        destination_dir: Path to the folder where to search for the needed files
-    Returns:
-        True if there are no objects to download, False otherwise.
-    """
+            logger.warning("Downloaded object {} is corrupted (attempt {}/{}).".format(object_name,
+                                                                                        attempt + 1,
+                                                                                        self._max_attempts))
 
-    # select just the objects not already present from the needed objects
-    objects_to_download = {key: obj for key, obj in needed_objects.items()
-                           if not os.path.exists(os.path.join(destination_dir, obj))}
+            # remove corrupted file so that the next attempt starts from scratch
+            os.remove(part_path)
 
-    # if there are no objects to download return true
-    return len(objects_to_download) == 0
+        # raise exception
+        raise IOError("Could not download object {} from s3 bucket.".format(object_name))
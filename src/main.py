@@ -2,7 +2,10 @@ import configparser  # implements a basic configuration language for Python prog
 import json  # json encoder and decoder
 import os  # provides a portable way of using operating system dependent functionality
 import tempfile
-from urllib import parse  # standard interface to break Uniform Resource Locator (URL) in components
+from collections import namedtuple  # factory function for creating tuple subclasses with named fields
+from functools import lru_cache, partial  # memoizing decorator and partial function application
+from multiprocessing.pool import ThreadPool  # pool of worker threads jobs can be submitted to
+from types import MappingProxyType  # read-only proxy of a mapping
 
 import baker  # easy, powerful access to Python functions from the command line
 import mlflow  # open source platform for managing the end-to-end machine learning lifecycle
@@ -10,17 +13,243 @@ from logzero import logger  # robust and effective logging for Python
 from mlflow.utils import mlflow_tags  # mlflow tags
 
 from FreshDatasetBuilder.utils.fresh_dataset_utils import check_files as fresh_check_files
-from Sorel20mDataset.utils.download_utils import check_files as download_check_files
+from Sorel20mDataset.utils.dataset_utils import check_files as download_check_files
 from Sorel20mDataset.utils.preproc_utils import check_files as preproc_check_files
-from utils.workflow_utils import Hash, get_or_run, run
+from utils.workflow_utils import Hash, get_artifact_path, get_or_run, run, temp_json_file
 
 # get config file path
 src_dir = os.path.dirname(os.path.abspath(__file__))
 config_filepath = os.path.join(src_dir, 'config.ini')
 
 # instantiate config parser and read config file
-config = configparser.ConfigParser()
-config.read(config_filepath)
+config_parser = configparser.ConfigParser()
+config_parser.read(config_filepath)
+
+# get the config file content once as plain dicts, one for each config file section (reading raw values since the
+# config file does not use interpolation)
+config = {s: dict(config_parser.items(s, raw=True)) for s in config_parser.sections()}
+
+# serialize the whole config file content to json once (logged as 'config.txt' artifact by every workflow)
+config_json = json.dumps(config)
+
+# serialize each config file section to utf-8 encoded json once (used to compute config digests), keeping the config
+# file keys order so that the digests match the ones of the previously executed runs
+sections_json = {s: json.dumps(section).encode('utf-8') for s, section in config.items()}
+
+
+@lru_cache(maxsize=None)
+def _config_hash(*sections):  # names of the config file sections the hash depends on
+    """ Get (memoized) hash object of the content of the specified config file sections.
+
+    Args:
+        sections: Names of the config file sections the hash depends on (in order)
+    Returns:
+        Hash instance updated with the content of the sections (must not be updated further).
+    """
+
+    # if there are no sections, return an empty hash
+    if len(sections) == 0:
+        return Hash()
+
+    # otherwise extend a copy of the (memoized) hash of all the sections but the last one with the last section
+    # content. Since the workflows digests depend on growing sequences of sections (e.g. sorel20mDataset, then
+    # sorel20mDataset + net type, etc.) each section is hashed only once.
+    return _config_hash(*sections[:-1]).copy().update(sections_json[sections[-1]])
+
+
+@lru_cache(maxsize=None)
+def config_digest(*sections):  # names of the config file sections the digest depends on
+    """ Get (memoized) digest of the content of the specified config file sections.
+
+    Args:
+        sections: Names of the config file sections the digest depends on (in order)
+    Returns:
+        Base64 encoding of the digest of the sections content.
+    """
+
+    # return digest of the sections content (the same as the one of the concatenated sections)
+    return _config_hash(*sections).get_b64()
+
+
+# dataset paths namedtuple (as returned by prepare_datasets)
+DatasetPaths = namedtuple('DatasetPaths', ['dataset_dir',
+                                           'dataset_base_path',
+                                           'pre_processed_dataset_dir',
+                                           'fresh_dataset_dir'])
+
+
+def prepare_fresh_dataset(base_dir,  # base tool path
+                          fresh_dataset_config_sha):  # digest of the freshDataset config
+    """ Get the fresh dataset dir, building the fresh dataset if needed.
+
+    Args:
+        base_dir: Base tool path
+        fresh_dataset_config_sha: Digest of the freshDataset config
+    Returns:
+        The fresh dataset dir.
+    """
+
+    # set fresh dataset base path (directory containing .dat files)
+    fresh_dataset_dir = os.path.join(base_dir, 'dataset', 'fresh_dataset')
+
+    # if the fresh dataset is not present, generate it
+    if not fresh_check_files(fresh_dataset_dir):
+        logger.info("Fresh dataset not found.")
+
+        # generate fresh dataset
+        build_fresh_dataset_run = run("build_fresh_dataset", {
+            'dataset_dest_dir': fresh_dataset_dir
+        }, config_sha=fresh_dataset_config_sha)
+
+    # return fresh dataset dir
+    return fresh_dataset_dir
+
+
+def prepare_sorel20m_dataset(dataset_dir,  # dataset destination dir
+                             dataset_base_path,  # dataset base path (directory containing 'meta.db')
+                             pre_processed_dataset_dir,  # pre-processed dataset dir
+                             n_samples_dict,  # key-n_samples dict
+                             batch_size,  # how many samples per batch to load during pre-processing
+                             dataset_config_sha):  # digest of the sorel20mDataset config
+    """ Download and pre-process the Sorel20M dataset if needed.
+
+    Args:
+        dataset_dir: Dataset destination dir
+        dataset_base_path: Dataset base path (directory containing 'meta.db')
+        pre_processed_dataset_dir: Pre-processed dataset dir
+        n_samples_dict: Key-n_samples dict
+        batch_size: How many samples per batch to load during pre-processing
+        dataset_config_sha: Digest of the sorel20mDataset config
+    """
+
+    # if pre-processed dataset files for this run parameters are not present, generate them
+    if not preproc_check_files(destination_dir=pre_processed_dataset_dir,
+                               n_samples_dict=n_samples_dict):
+        logger.info("Pre-processed dataset not found.")
+
+        # if the original Sorel20M dataset is not present, download it
+        if not download_check_files(dataset_dir):
+            logger.info("Dataset not found.")
+
+            # run dataset downloader
+            download_dataset_run = run("download_dataset", {
+                'destination_dir': dataset_dir
+            }, config_sha=dataset_config_sha)
+
+        # pre-process dataset
+        preprocess_dataset_run = run("preprocess_dataset", {
+            'ds_path': dataset_base_path,
+            'destination_dir': pre_processed_dataset_dir,
+            'training_n_samples': n_samples_dict['train'],
+            'validation_n_samples': n_samples_dict['validation'],
+            'test_n_samples': n_samples_dict['test'],
+            'batch_size': batch_size,
+            'remove_missing_features': str(os.path.join(dataset_base_path, "shas_missing_ember_features.json"))
+        }, config_sha=dataset_config_sha)
+
+
+def prepare_datasets(base_dir,  # base tool path
+                     n_samples_dict,  # key-n_samples dict
+                     batch_size,  # how many samples per batch to load during pre-processing
+                     dataset_config_sha,  # digest of the sorel20mDataset config
+                     fresh_dataset_config_sha,  # digest of the freshDataset config
+                     parallel_steps=1):  # maximum number of steps to execute at the same time (default: 1)
+    """ Get the dataset paths, downloading, pre-processing and building the Sorel20M and fresh datasets if needed.
+
+    Args:
+        base_dir: Base tool path
+        n_samples_dict: Key-n_samples dict
+        batch_size: How many samples per batch to load during pre-processing
+        dataset_config_sha: Digest of the sorel20mDataset config
+        fresh_dataset_config_sha: Digest of the freshDataset config
+        parallel_steps: Maximum number of steps to execute at the same time (default: 1)
+    Returns:
+        DatasetPaths namedtuple containing the dataset dir, the dataset base path, the pre-processed dataset dir and
+        the fresh dataset dir.
+    """
+
+    # set dataset destination dir
+    dataset_dir = os.path.join(base_dir, 'dataset')
+    # set Sorel20M dataset release dir (common prefix of the dataset base path and the pre-processed dataset dir)
+    release_dir = os.path.join(dataset_dir, '09-DEC-2020')
+    # set dataset base path (directory containing 'meta.db')
+    dataset_base_path = os.path.join(release_dir, 'processed-data')
+    # set pre-processed dataset base path (directory containing .dat files)
+    pre_processed_dataset_dir = os.path.join(release_dir, 'pre-processed_dataset')
+
+    # if only one step at a time is allowed, prepare the Sorel20M dataset and then the fresh dataset
+    if parallel_steps <= 1:
+        prepare_sorel20m_dataset(dataset_dir, dataset_base_path, pre_processed_dataset_dir, n_samples_dict, batch_size,
+                                 dataset_config_sha)
+        fresh_dataset_dir = prepare_fresh_dataset(base_dir, fresh_dataset_config_sha)
+    else:
+        # otherwise instantiate thread-pool used to build the fresh dataset (which does not depend on the Sorel20M
+        # dataset) while the Sorel20M dataset is downloaded and pre-processed
+        with ThreadPool(1) as pool:
+            # get the fresh dataset dir, generating the fresh dataset if it is not present (asynchronously)
+            prepare_fresh_dataset_result = pool.apply_async(prepare_fresh_dataset,
+                                                            (base_dir, fresh_dataset_config_sha))
+
+            try:
+                prepare_sorel20m_dataset(dataset_dir, dataset_base_path, pre_processed_dataset_dir, n_samples_dict,
+                                         batch_size, dataset_config_sha)
+            finally:
+                # wait for the fresh dataset generation to complete before leaving the pool, even if the Sorel20M
+                # dataset preparation failed (so that the fresh dataset run is never left running)
+                prepare_fresh_dataset_result.wait()
+
+            # get the fresh dataset dir (re-raising any exception occurred while generating the fresh dataset)
+            fresh_dataset_dir = prepare_fresh_dataset_result.get()
+
+    # return dataset paths
+    return DatasetPaths(dataset_dir=dataset_dir,
+                        dataset_base_path=dataset_base_path,
+                        pre_processed_dataset_dir=pre_processed_dataset_dir,
+                        fresh_dataset_dir=fresh_dataset_dir)
+
+
+def execute_training_runs(do_training_run,  # function executing (get or run) all the steps of a single training run
+                          runs,  # number of training runs to execute
+                          parallel_runs):  # maximum number of training runs to execute at the same time
+    """ Execute all the training runs, concurrently if more than one training run at a time is allowed.
+
+    Args:
+        do_training_run: Function executing (get or run) all the steps of a single training run, given its id
+        runs: Number of training runs to execute
+        parallel_runs: Maximum number of training runs to execute at the same time
+    Returns:
+        List containing the value returned by do_training_run for each training run (in training run id order).
+    """
+
+    # if more than one training run at a time is allowed, execute the training runs concurrently
+    if parallel_runs > 1:
+        # instantiate thread-pool (the training runs steps are executed as mlflow runs, in separate processes)
+        with ThreadPool(min(runs, parallel_runs)) as pool:
+            return pool.map(do_training_run, range(runs))
+
+    # otherwise execute the training runs one after the other
+    return [do_training_run(training_run_id) for training_run_id in range(runs)]
+
+
+def execute_steps(steps,  # list of independent workflow steps (functions without arguments) to execute
+                  parallel_steps):  # maximum number of steps to execute at the same time
+    """ Execute independent workflow steps, concurrently if more than one step at a time is allowed.
+
+    Args:
+        steps: List of independent workflow steps (functions without arguments) to execute
+        parallel_steps: Maximum number of steps to execute at the same time
+    Returns:
+        List containing the value returned by each step (in the same order as the steps).
+    """
+
+    # if more than one step at a time is allowed, execute the steps concurrently
+    if parallel_steps > 1:
+        # instantiate thread-pool (the steps are executed as mlflow runs, in separate processes)
+        with ThreadPool(min(len(steps), parallel_steps)) as pool:
+            return pool.map(lambda step: step(), steps)
+
+    # otherwise execute the steps one after the other
+    return [step() for step in steps]
 
 
 @baker.command
@@ -37,6 +266,8 @@ def workflow(base_dir,  # base tool path
 
     # get some needed variables from config file
     runs = int(config['general']['runs'])
+    parallel_runs = int(config['general']['parallel_runs'])
+    parallel_steps = int(config['general']['parallel_steps'])
     workers = int(config['general']['workers'])
 
     batch_size = int(config['jointEmbedding']['batch_size'])
@@ -46,6 +277,8 @@ def workflow(base_dir,  # base tool path
     gen_type = config['jointEmbedding']['gen_type']
     similarity_measure = config['jointEmbedding']['similarity_measure'].lower()
     net_type = 'jointEmbedding'
+    # get net type to train/evaluate (with the similarity measure as suffix if it is not the default dot product)
+    resolved_net_type = net_type if similarity_measure == 'dot' else '{}_{}'.format(net_type, similarity_measure)
 
     training_n_samples = int(config['sorel20mDataset']['training_n_samples'])
     validation_n_samples = int(config['sorel20mDataset']['validation_n_samples'])
@@ -71,36 +304,17 @@ def workflow(base_dir,  # base tool path
     c_l_knn_k_min = int(config['contrastiveLearning']['knn_k_min'])
     c_l_knn_k_max = int(config['contrastiveLearning']['knn_k_max'])
 
-    # initialize Hash object
-    ch = Hash()
-
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items('sorel20mDataset'))))
-    # get config file sha256 digest
-    dataset_config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items(net_type))))
-    # get config file sha256 digest
-    config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('freshDataset'))))
-    # get config file sha256 digest
-    fresh_dataset_config_sha = ch.get_b64()
-
-    # create copy of the current config hash digest
-    ch_copy = ch.copy()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('familyClassifier'))))
-    # get config file sha256 digest
-    family_class_config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch_copy.update(json.dumps(dict(config.items('contrastiveLearning'))))
-    # get config file sha256 digest
-    contr_learn_config_sha = ch_copy.get_b64()
+    # get config file digests, each one computed (in a single pass) over the content of the config file sections
+    # it depends on: sorel20mDataset
+    dataset_config_sha = config_digest('sorel20mDataset')
+    # sorel20mDataset + current net type
+    config_sha = config_digest('sorel20mDataset', net_type)
+    # sorel20mDataset + current net type + freshDataset
+    fresh_dataset_config_sha = config_digest('sorel20mDataset', net_type, 'freshDataset')
+    # sorel20mDataset + current net type + freshDataset + familyClassifier
+    family_class_config_sha = config_digest('sorel20mDataset', net_type, 'freshDataset', 'familyClassifier')
+    # sorel20mDataset + current net type + freshDataset + contrastiveLearning
+    contr_learn_config_sha = config_digest('sorel20mDataset', net_type, 'freshDataset', 'contrastiveLearning')
 
     # instantiate key-n_samples dict
     n_samples_dict = {'train': training_n_samples,
@@ -114,61 +328,32 @@ def workflow(base_dir,  # base tool path
     with mlflow.start_run() as active_run:
         # get code git commit version
         git_commit = active_run.data.tags.get(mlflow_tags.MLFLOW_GIT_COMMIT)
+        # bind get_or_run to the code git commit version and to the cache settings (shared by all the workflow steps)
+        get_or_run_step = partial(get_or_run,
+                                  git_commit=git_commit,
+                                  ignore_git=bool(ignore_git),
+                                  use_cache=bool(use_cache))
 
         # log config file
-        mlflow.log_text(json.dumps({s: dict(config.items(s)) for s in config.sections()}), 'config.txt')
-
-        # set dataset destination dir
-        dataset_dir = os.path.join(base_dir, 'dataset')
-        # set dataset base path (directory containing 'meta.db')
-        dataset_base_path = os.path.join(dataset_dir, '09-DEC-2020', 'processed-data')
-        # set pre-processed dataset base path (directory containing .dat files)
-        pre_processed_dataset_dir = os.path.join(dataset_dir, '09-DEC-2020', 'pre-processed_dataset')
-        # set fresh dataset base path (directory containing .dat files)
-        fresh_dataset_dir = os.path.join(dataset_dir, 'fresh_dataset')
-
-        # if pre-processed dataset files for this run parameters are not present, generate them
-        if not preproc_check_files(destination_dir=pre_processed_dataset_dir,
-                                   n_samples_dict=n_samples_dict):
-            logger.info("Pre-processed dataset not found.")
-
-            # if the original Sorel20M dataset is not present, download it
-            if not download_check_files(dataset_dir):
-                logger.info("Dataset not found.")
-
-                # run dataset downloader
-                download_dataset_run = run("download_dataset", {
-                    'destination_dir': dataset_dir
-                }, config_sha=dataset_config_sha)
-
-            # pre-process dataset
-            preprocess_dataset_run = run("preprocess_dataset", {
-                'ds_path': dataset_base_path,
-                'destination_dir': pre_processed_dataset_dir,
-                'training_n_samples': training_n_samples,
-                'validation_n_samples': validation_n_samples,
-                'test_n_samples': test_n_samples,
-                'batch_size': batch_size,
-                'remove_missing_features': str(os.path.join(dataset_base_path, "shas_missing_ember_features.json"))
-            }, config_sha=dataset_config_sha)
+        mlflow.log_text(config_json, 'config.txt')
 
-        # if the fresh dataset is not present, generate it
-        if not fresh_check_files(fresh_dataset_dir):
-            logger.info("Fresh dataset not found.")
-
-            # generate fresh dataset
-            build_fresh_dataset_run = run("build_fresh_dataset", {
-                'dataset_dest_dir': fresh_dataset_dir
-            }, config_sha=fresh_dataset_config_sha)
+        # get dataset paths (downloading, pre-processing and building the datasets if they are not present)
+        dataset_dir, dataset_base_path, pre_processed_dataset_dir, fresh_dataset_dir = \
+            prepare_datasets(base_dir=base_dir,
+                             n_samples_dict=n_samples_dict,
+                             batch_size=batch_size,
+                             dataset_config_sha=dataset_config_sha,
+                             fresh_dataset_config_sha=fresh_dataset_config_sha,
+                             parallel_steps=parallel_steps)
 
         # initialize results files dicts
         results_files = {}
         c_l_results_files = {}
 
-        # instantiate common (between consecutive training runs) training parameters
-        common_training_params = {
+        # instantiate common (between consecutive training runs) training parameters (read-only)
+        common_training_params = MappingProxyType({
             'ds_path': pre_processed_dataset_dir,
-            'net_type': net_type if similarity_measure == 'dot' else net_type + '_{}'.format(similarity_measure),
+            'net_type': resolved_net_type,
             'gen_type': gen_type,
             'batch_size': batch_size,
             'epochs': epochs,
@@ -177,264 +362,284 @@ def workflow(base_dir,  # base tool path
             'use_malicious_labels': use_malicious_labels,
             'use_count_labels': use_count_labels,
             'workers': workers
-        }
+        })
 
-        # instantiate common (between consecutive training runs) evaluation parameters
-        common_evaluation_params = {
+        # instantiate common (between consecutive training runs) evaluation parameters (read-only)
+        common_evaluation_params = MappingProxyType({
             'ds_path': pre_processed_dataset_dir,
-            'net_type': net_type if similarity_measure == 'dot' else net_type + '_{}'.format(similarity_measure),
+            'net_type': resolved_net_type,
             'gen_type': gen_type,
             'batch_size': batch_size,
             'test_n_samples': test_n_samples,
             'evaluate_malware': use_malicious_labels,
             'evaluate_count': use_count_labels
-        }
+        })
+
+        # instantiate common (between consecutive training runs) fresh dataset evaluation parameters (read-only)
+        common_fresh_eval_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'net_type': resolved_net_type,
+            'min_n_anchor_samples': min_n_anchor_samples,
+            'max_n_anchor_samples': max_n_anchor_samples,
+            'n_query_samples': fresh_n_queries,
+            'n_evaluations': n_evaluations
+        })
+
+        # instantiate common (between consecutive training runs) family classifier parameters (read-only)
+        common_f_c_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'train_split_proportion': f_c_train_split_proportion,
+            'valid_split_proportion': f_c_valid_split_proportion,
+            'test_split_proportion': f_c_test_split_proportion,
+            'batch_size': f_c_batch_size
+        })
+
+        # instantiate common (between consecutive training runs) contrastive learning parameters (read-only)
+        common_c_l_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'train_split_proportion': c_l_train_split_proportion,
+            'valid_split_proportion': c_l_valid_split_proportion,
+            'test_split_proportion': c_l_test_split_proportion,
+            'batch_size': c_l_batch_size
+        })
+
+        # set model checkpoint file names (the same for all the training runs)
+        checkpoint_filename = "epoch_{}.pt".format(epochs)
+        f_c_checkpoint_filename = "epoch_{}.pt".format(f_c_epochs)
+        c_l_checkpoint_filename = "epoch_{}.pt".format(c_l_epochs)
+
+        def do_training_run(training_run_id):  # training run identifier
+            """ Execute (get or run) all the steps of a single training run.
+
+            Args:
+                training_run_id: Training run identifier
+            Returns:
+                Model evaluation results file and contrastive learning scores dir path.
+            """
 
-        # for each training run
-        for training_run_id in range(runs):
             logger.info("initiating training run n. {}".format(str(training_run_id)))
 
-            # -- Model Training and Evaluation Steps -------------------------------------------------------------------
-            # set training parameters
-            training_params = common_training_params
-            training_params.update({'training_run': training_run_id})
+            # -- Model Training Steps ----------------------------------------------------------------------------------
+            # set training parameters (copying the common ones, since training runs may be executed concurrently)
+            training_params = {**common_training_params, 'training_run': training_run_id}
 
             # train network (get or run) on Sorel20M dataset
-            training_run = get_or_run("train_network",
-                                      training_params,
-                                      git_commit,
-                                      ignore_git=bool(ignore_git),
-                                      use_cache=bool(use_cache),
-                                      resume=True,
-                                      config_sha=config_sha)
+            training_run = get_or_run_step("train_network",
+                                           training_params,
+                                           resume=True,
+                                           config_sha=config_sha)
+
+            # get model checkpoint filename (inside the run artifacts)
+            checkpoint_file = get_artifact_path(training_run.info.artifact_uri,
+                                                "model_checkpoints",
+                                                checkpoint_filename)
+            # ----------------------------------------------------------------------------------------------------------
 
-            # get model checkpoints path
-            checkpoint_path = parse.unquote(parse.urlparse(os.path.join(training_run.info.artifact_uri,
-                                                                        "model_checkpoints")).path)
+            # the model evaluation, fresh dataset evaluation, family classifier and contrastive learning steps only
+            # depend on the trained model -> define them as independent chains of steps
 
-            # set model checkpoint filename
-            checkpoint_file = os.path.join(checkpoint_path, "epoch_{}.pt".format(epochs))
+            # -- Model Evaluation Steps --------------------------------------------------------------------------------
+            def do_evaluation():
+                """ Execute (get or run) the model evaluation steps (on Sorel20M dataset).
 
-            # set evaluation parameters
-            evaluation_params = common_evaluation_params
-            evaluation_params.update({'checkpoint_file': checkpoint_file})
+                Returns:
+                    Model evaluation results file.
+                """
 
-            # evaluate model against Sorel20M dataset
-            evaluation_run = get_or_run("evaluate_network",
-                                        evaluation_params,
-                                        git_commit,
-                                        ignore_git=bool(ignore_git),
-                                        use_cache=bool(use_cache),
-                                        config_sha=config_sha)
+                # set evaluation parameters (copying the common ones, since training runs may be executed concurrently)
+                evaluation_params = {**common_evaluation_params, 'checkpoint_file': checkpoint_file}
 
-            # get model evaluation results path
-            results_path = parse.unquote(parse.urlparse(os.path.join(evaluation_run.info.artifact_uri,
-                                                                     "model_results")).path)
+                # evaluate model against Sorel20M dataset
+                evaluation_run = get_or_run_step("evaluate_network",
+                                                 evaluation_params,
+                                                 config_sha=config_sha)
 
-            # set model evaluation results filename
-            results_file = os.path.join(results_path, "results.csv")
+                # get model evaluation results filename (inside the run artifacts)
+                results_file = get_artifact_path(evaluation_run.info.artifact_uri, "model_results", "results.csv")
 
-            # add file path to results_files dictionary (used for plotting mean results)
-            results_files["run_id_" + str(training_run_id)] = results_file
+                # compute (and plot) all tagging results
+                all_tagging_results_run = get_or_run_step("compute_all_run_results", {
+                    'results_file': results_file,
+                    'use_malicious_labels': use_malicious_labels,
+                    'use_tag_labels': 1
+                }, config_sha=config_sha)
 
-            # compute (and plot) all tagging results
-            all_tagging_results_run = get_or_run("compute_all_run_results", {
-                'results_file': results_file,
-                'use_malicious_labels': use_malicious_labels,
-                'use_tag_labels': 1
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=config_sha)
+                # return model evaluation results file
+                return results_file
             # ----------------------------------------------------------------------------------------------------------
 
             # -- Model Evaluation using Fresh Dataset Steps ------------------------------------------------------------
-            # evaluate model against fresh dataset
-            fresh_evaluation_run = get_or_run("evaluate_fresh", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': checkpoint_file,
-                'net_type': net_type if similarity_measure == 'dot' else net_type + '_{}'.format(similarity_measure),
-                'min_n_anchor_samples': min_n_anchor_samples,
-                'max_n_anchor_samples': max_n_anchor_samples,
-                'n_query_samples': fresh_n_queries,
-                'n_evaluations': n_evaluations
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=fresh_dataset_config_sha)
-
-            # get model evaluation results path
-            fresh_results_path = parse.unquote(parse.urlparse(os.path.join(fresh_evaluation_run.info.artifact_uri,
-                                                                           "fresh_prediction_results")).path)
-
-            # set model evaluation results filename
-            fresh_results_file = os.path.join(fresh_results_path, "fresh_prediction_results.json")
-
-            # compute (and plot) all family prediction results (on fresh dataset)
-            all_tagging_results_run = get_or_run("compute_all_run_fresh_results", {
-                'results_file': fresh_results_file
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=fresh_dataset_config_sha)
+            def do_fresh_evaluation():
+                """ Execute (get or run) the model evaluation steps on the fresh dataset. """
+
+                # evaluate model against fresh dataset
+                fresh_evaluation_run = get_or_run_step("evaluate_fresh", {
+                    **common_fresh_eval_params,
+                    'checkpoint_path': checkpoint_file
+                }, config_sha=fresh_dataset_config_sha)
+
+                # get model evaluation results filename (inside the run artifacts)
+                fresh_results_file = get_artifact_path(fresh_evaluation_run.info.artifact_uri,
+                                                       "fresh_prediction_results",
+                                                       "fresh_prediction_results.json")
+
+                # compute (and plot) all family prediction results (on fresh dataset)
+                all_tagging_results_run = get_or_run_step("compute_all_run_fresh_results", {
+                    'results_file': fresh_results_file
+                }, config_sha=fresh_dataset_config_sha)
             # ----------------------------------------------------------------------------------------------------------
 
             # -- Family Classifier Steps -------------------------------------------------------------------------------
-            # create family classifier from previously trained network and train it on fresh dataset
-            f_c_train_run = get_or_run("train_family_classifier", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': checkpoint_file,
-                'epochs': f_c_epochs,
-                'training_run': training_run_id,
-                'train_split_proportion': f_c_train_split_proportion,
-                'valid_split_proportion': f_c_valid_split_proportion,
-                'test_split_proportion': f_c_test_split_proportion,
-                'batch_size': f_c_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
-
-            # get model checkpoints path
-            f_c_checkpoint_path = parse.unquote(parse.urlparse(os.path.join(f_c_train_run.info.artifact_uri,
-                                                                            "model_checkpoints")).path)
-
-            # set model checkpoint filename
-            f_c_checkpoint_file = os.path.join(f_c_checkpoint_path, "epoch_{}.pt".format(f_c_epochs))
-
-            # evaluate model against fresh dataset
-            f_c_eval_run = get_or_run("evaluate_family_classifier", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': f_c_checkpoint_file,
-                'training_run': training_run_id,
-                'train_split_proportion': f_c_train_split_proportion,
-                'valid_split_proportion': f_c_valid_split_proportion,
-                'test_split_proportion': f_c_test_split_proportion,
-                'batch_size': f_c_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
-
-            # get model evaluation results path
-            f_c_results_path = parse.unquote(parse.urlparse(os.path.join(f_c_eval_run.info.artifact_uri,
-                                                                         "family_class_results")).path)
-
-            # set model evaluation results filename
-            f_c_results_file = os.path.join(f_c_results_path, "results.csv")
-
-            # compute (and plot) all tagging results
-            f_c_compute_results_run = get_or_run("compute_all_family_class_results", {
-                'results_file': f_c_results_file,
-                'fresh_ds_path': fresh_dataset_dir
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
+            def do_family_classifier():
+                """ Execute (get or run) the family classifier steps. """
+
+                # create family classifier from previously trained network and train it on fresh dataset
+                f_c_train_run = get_or_run_step("train_family_classifier", {
+                    **common_f_c_params,
+                    'checkpoint_path': checkpoint_file,
+                    'epochs': f_c_epochs,
+                    'training_run': training_run_id
+                }, config_sha=family_class_config_sha)
+
+                # get model checkpoint filename (inside the run artifacts)
+                f_c_checkpoint_file = get_artifact_path(f_c_train_run.info.artifact_uri,
+                                                        "model_checkpoints",
+                                                        f_c_checkpoint_filename)
+
+                # evaluate model against fresh dataset
+                f_c_eval_run = get_or_run_step("evaluate_family_classifier", {
+                    **common_f_c_params,
+                    'checkpoint_path': f_c_checkpoint_file,
+                    'training_run': training_run_id
+                }, config_sha=family_class_config_sha)
+
+                # get model evaluation results filename (inside the run artifacts)
+                f_c_results_file = get_artifact_path(f_c_eval_run.info.artifact_uri,
+                                                     "family_class_results",
+                                                     "results.csv")
+
+                # compute (and plot) all tagging results
+                f_c_compute_results_run = get_or_run_step("compute_all_family_class_results", {
+                    'results_file': f_c_results_file,
+                    'fresh_ds_path': fresh_dataset_dir
+                }, config_sha=family_class_config_sha)
             # ----------------------------------------------------------------------------------------------------------
 
             # -- Contrastive Learning Steps ----------------------------------------------------------------------------
-            # create family classifier from previously trained network and train it on fresh dataset
-            c_l_train_run = get_or_run("train_contrastive_net", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': checkpoint_file,
-                'epochs': c_l_epochs,
-                'training_run': training_run_id,
-                'train_split_proportion': c_l_train_split_proportion,
-                'valid_split_proportion': c_l_valid_split_proportion,
-                'test_split_proportion': c_l_test_split_proportion,
-                'batch_size': c_l_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-            # get model checkpoints path
-            c_l_checkpoint_path = parse.unquote(parse.urlparse(os.path.join(c_l_train_run.info.artifact_uri,
-                                                                            "model_checkpoints")).path)
-
-            # set model checkpoint filename
-            c_l_checkpoint_file = os.path.join(c_l_checkpoint_path, "epoch_{}.pt".format(c_l_epochs))
-
-            # evaluate model against fresh dataset
-            c_l_eval_run = get_or_run("evaluate_contrastive_net", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': c_l_checkpoint_file,
-                'training_run': training_run_id,
-                'train_split_proportion': c_l_train_split_proportion,
-                'valid_split_proportion': c_l_valid_split_proportion,
-                'test_split_proportion': c_l_test_split_proportion,
-                'batch_size': c_l_batch_size,
-                'rank_size': c_l_rank_size,
-                'knn_k_min': c_l_knn_k_min,
-                'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-            # get model evaluation results path
-            c_l_results_path = parse.unquote(parse.urlparse(os.path.join(c_l_eval_run.info.artifact_uri,
-                                                                         "contrastive_learning_results")).path)
+            def do_contrastive_learning():
+                """ Execute (get or run) the contrastive learning steps.
+
+                Returns:
+                    Contrastive learning scores dir path.
+                """
+
+                # create family classifier from previously trained network and train it on fresh dataset
+                c_l_train_run = get_or_run_step("train_contrastive_net", {
+                    **common_c_l_params,
+                    'checkpoint_path': checkpoint_file,
+                    'epochs': c_l_epochs,
+                    'training_run': training_run_id
+                }, config_sha=contr_learn_config_sha)
+
+                # get model checkpoint filename (inside the run artifacts)
+                c_l_checkpoint_file = get_artifact_path(c_l_train_run.info.artifact_uri,
+                                                        "model_checkpoints",
+                                                        c_l_checkpoint_filename)
+
+                # evaluate model against fresh dataset
+                c_l_eval_run = get_or_run_step("evaluate_contrastive_net", {
+                    **common_c_l_params,
+                    'checkpoint_path': c_l_checkpoint_file,
+                    'training_run': training_run_id,
+                    'rank_size': c_l_rank_size,
+                    'knn_k_min': c_l_knn_k_min,
+                    'knn_k_max': c_l_knn_k_max
+                }, config_sha=contr_learn_config_sha)
+
+                # get model evaluation results filename (inside the run artifacts)
+                c_l_results_file = get_artifact_path(c_l_eval_run.info.artifact_uri,
+                                                     "contrastive_learning_results",
+                                                     "results.csv")
+
+                # compute (and plot) all tagging results
+                c_l_compute_results_run = get_or_run_step("compute_contrastive_learning_results", {
+                    'results_file': c_l_results_file,
+                    'fresh_ds_path': fresh_dataset_dir,
+                    'knn_k_min': c_l_knn_k_min,
+                    'knn_k_max': c_l_knn_k_max
+                }, config_sha=contr_learn_config_sha)
+
+                # get model evaluation results path
+                c_l_scores_dir_path = get_artifact_path(c_l_compute_results_run.info.artifact_uri,
+                                                        "contrastive_learning_scores")
+
+                # return contrastive learning scores dir path
+                return c_l_scores_dir_path
+            # ----------------------------------------------------------------------------------------------------------
 
-            # set model evaluation results filename
-            c_l_results_file = os.path.join(c_l_results_path, "results.csv")
+            # execute the chains of steps (concurrently if allowed)
+            results_file, _, _, c_l_scores_dir_path = execute_steps([do_evaluation,
+                                                                     do_fresh_evaluation,
+                                                                     do_family_classifier,
+                                                                     do_contrastive_learning], parallel_steps)
 
-            # compute (and plot) all tagging results
-            c_l_compute_results_run = get_or_run("compute_contrastive_learning_results", {
-                'results_file': c_l_results_file,
-                'fresh_ds_path': fresh_dataset_dir,
-                'knn_k_min': c_l_knn_k_min,
-                'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-            # get model evaluation results path
-            c_l_scores_dir_path = parse.unquote(parse.urlparse(os.path.join(c_l_compute_results_run.info.artifact_uri,
-                                                                            "contrastive_learning_scores")).path)
+            # return model evaluation results file and contrastive learning scores dir path
+            return results_file, c_l_scores_dir_path
 
+        # for each training run (executed concurrently if allowed)
+        for training_run_id, (results_file, c_l_scores_dir_path) in enumerate(execute_training_runs(do_training_run,
+                                                                                                   runs,
+                                                                                                   parallel_runs)):
+            # add file path to results_files dictionary (used for plotting mean results)
+            results_files["run_id_" + str(training_run_id)] = results_file
             # add dir path to c_l_results_files dictionary (used for plotting mean score trends)
             c_l_results_files["run_id_" + str(training_run_id)] = c_l_scores_dir_path
-            # ----------------------------------------------------------------------------------------------------------
 
-        # create temp dir name using the value from config_sha (sha of some parts of the config file).
-        # -> This is done in order to have a different (but predictable) run_to_filename at each set of runs with
-        # different parameters. This allows mlflow to know when it is needed to run 'per_tag_plot_runs'. If, on the
-        # other hand a simple tempfile.TemporaryDirectory() was used then mlflow would run 'per_tag_plot_runs' every
-        # time, even if a precedent run was available (because the parameter 'run_to_filename_json' would be different)
-        tempdir = os.path.join(base_dir, 'tmp_{}'.format(config_sha))
-        # create temp dir
-        os.makedirs(tempdir, exist_ok=True)
-
-        # create contrastive learning temp dir name using the value from config_sha (sha of some parts of the config
-        # file). -> This is done in order to have a different (but predictable) run_to_filename at each set of runs with
-        # different parameters. This allows mlflow to know when it is needed to run 'per_tag_plot_runs'. If, on the
-        # other hand a simple tempfile.TemporaryDirectory() was used then mlflow would run 'per_tag_plot_runs' every
-        # time, even if a precedent run was available (because the parameter 'run_to_filename_json' would be different)
-        c_l_tempdir = os.path.join(base_dir, 'tmp_{}'.format(contr_learn_config_sha))
-        # create temp dir
-        os.makedirs(c_l_tempdir, exist_ok=True)
-
-        # set run-to-filename file path
-        run_to_filename = os.path.join(tempdir, "results.json")
-
-        # create and open the results.json file in write mode
-        with open(run_to_filename, "w") as output_file:
-            # save results_files dictionary as a json file
-            json.dump(results_files, output_file)
-
-        mlflow.log_artifact(run_to_filename, "run_to_filename")
-
-        # set run-to-filename file path
-        c_l_run_to_filename = os.path.join(c_l_tempdir, "c_l_results.json")
-
-        # create and open the c_l_results.json file in write mode
-        with open(c_l_run_to_filename, "w") as output_file:
-            # save c_l_results_files dictionary as a json file
-            json.dump(c_l_results_files, output_file)
-
-        mlflow.log_artifact(c_l_run_to_filename, "run_to_filename")
-
-        # if there is more than 1 run, compute also per-tag mean results
+        # if there is more than 1 run, compute also per-tag mean results and model mean scores trends (the
+        # run-to-filename json files are only needed by these runs, so they are not created at all otherwise)
         if runs > 1:
-            # plot all roc distributions
-            per_tag_plot_runs = get_or_run("plot_all_roc_distributions", {
-                'run_to_filename_json': run_to_filename,
-                'use_malicious_labels': use_malicious_labels,
-                'use_tag_labels': 1
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=config_sha)
-
-            # plot all model mean scores trends
-            plot_all_scores_trends = get_or_run("plot_all_scores_trends", {
-                'run_to_filename_json': c_l_run_to_filename,
-                'knn_k_min': c_l_knn_k_min,
-                'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-        # remove temp files and temporary directory
-        os.remove(run_to_filename)
-        # os.remove(fresh_run_to_filename)
-        os.rmdir(tempdir)
-
-        # remove contrastive learning temp files and temporary directory
-        os.remove(c_l_run_to_filename)
-        # os.remove(fresh_run_to_filename)
-        os.rmdir(c_l_tempdir)
+            # create temp dir name using the value from config_sha (sha of some parts of the config file).
+            # -> This is done in order to have a different (but predictable) run_to_filename at each set of runs with
+            # different parameters. This allows mlflow to know when it is needed to run 'per_tag_plot_runs'. If, on
+            # the other hand a simple tempfile.TemporaryDirectory() was used then mlflow would run 'per_tag_plot_runs'
+            # every time, even if a precedent run was available (because the parameter 'run_to_filename_json' would
+            # be different)
+            tempdir = os.path.join(base_dir, 'tmp_{}'.format(config_sha))
+
+            # create contrastive learning temp dir name using the value from config_sha (sha of some parts of the
+            # config file). -> This is done in order to have a different (but predictable) run_to_filename at each set
+            # of runs with different parameters. This allows mlflow to know when it is needed to run
+            # 'plot_all_scores_trends'.
+            c_l_tempdir = os.path.join(base_dir, 'tmp_{}'.format(contr_learn_config_sha))
+
+            # save results_files and c_l_results_files dictionaries as json files inside the temp dirs (temp files and
+            # directories are removed on exit, even if some run fails)
+            with temp_json_file(tempdir, "results.json", results_files) as run_to_filename, \
+                    temp_json_file(c_l_tempdir, "c_l_results.json", c_l_results_files) as c_l_run_to_filename, \
+                    ThreadPool(1) as log_pool:
+
+                # log run-to-filename files in background, overlapping their upload with the plotting runs
+                log_result = log_pool.starmap_async(mlflow.log_artifact, [(run_to_filename, "run_to_filename"),
+                                                                          (c_l_run_to_filename, "run_to_filename")])
+
+                try:
+                    # plot all roc distributions
+                    per_tag_plot_runs = get_or_run_step("plot_all_roc_distributions", {
+                        'run_to_filename_json': run_to_filename,
+                        'use_malicious_labels': use_malicious_labels,
+                        'use_tag_labels': 1
+                    }, config_sha=config_sha)
+
+                    # plot all model mean scores trends
+                    plot_all_scores_trends = get_or_run_step("plot_all_scores_trends", {
+                        'run_to_filename_json': c_l_run_to_filename,
+                        'knn_k_min': c_l_knn_k_min,
+                        'knn_k_max': c_l_knn_k_max
+                    }, config_sha=contr_learn_config_sha)
+                finally:
+                    # wait for the run-to-filename upload to complete before the temp files are removed (even if some
+                    # plot run failed), re-raising any exception occurred while uploading
+                    log_result.get()
 
 
 @baker.command
@@ -451,6 +656,8 @@ def detection_workflow(base_dir,  # base tool path
 
     # get some needed variables from config file
     runs = int(config['general']['runs'])
+    parallel_runs = int(config['general']['parallel_runs'])
+    parallel_steps = int(config['general']['parallel_steps'])
     workers = int(config['general']['workers'])
 
     batch_size = int(config['detectionBase']['batch_size'])
@@ -470,23 +677,13 @@ def detection_workflow(base_dir,  # base tool path
     fresh_n_queries = int(config['freshDataset']['n_queries'])
     n_evaluations = int(config['freshDataset']['n_evaluations'])
 
-    # initialize Hash object
-    ch = Hash()
-
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items('sorel20mDataset'))))
-    # get config file sha256 digest
-    dataset_config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items(net_type))))
-    # get config file sha256 digest
-    config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('freshDataset'))))
-    # get config file sha256 digest
-    fresh_dataset_config_sha = ch.get_b64()
+    # get config file digests, each one computed (in a single pass) over the content of the config file sections
+    # it depends on: sorel20mDataset
+    dataset_config_sha = config_digest('sorel20mDataset')
+    # sorel20mDataset + current net type
+    config_sha = config_digest('sorel20mDataset', net_type)
+    # sorel20mDataset + current net type + freshDataset
+    fresh_dataset_config_sha = config_digest('sorel20mDataset', net_type, 'freshDataset')
 
     # instantiate key-n_samples dict
     n_samples_dict = {'train': training_n_samples,
@@ -500,59 +697,30 @@ def detection_workflow(base_dir,  # base tool path
     with mlflow.start_run() as active_run:
         # get code git commit version
         git_commit = active_run.data.tags.get(mlflow_tags.MLFLOW_GIT_COMMIT)
+        # bind get_or_run to the code git commit version and to the cache settings (shared by all the workflow steps)
+        get_or_run_step = partial(get_or_run,
+                                  git_commit=git_commit,
+                                  ignore_git=bool(ignore_git),
+                                  use_cache=bool(use_cache))
 
         # log config file
-        mlflow.log_text(json.dumps({s: dict(config.items(s)) for s in config.sections()}), 'config.txt')
-
-        # set dataset destination dir
-        dataset_dir = os.path.join(base_dir, 'dataset')
-        # set dataset base path (directory containing 'meta.db')
-        dataset_base_path = os.path.join(dataset_dir, '09-DEC-2020', 'processed-data')
-        # set pre-processed dataset base path (directory containing .dat files)
-        pre_processed_dataset_dir = os.path.join(dataset_dir, '09-DEC-2020', 'pre-processed_dataset')
-        # set fresh dataset base path (directory containing .dat files)
-        fresh_dataset_dir = os.path.join(dataset_dir, 'fresh_dataset')
-
-        # if pre-processed dataset files for this run parameters are not present, generate them
-        if not preproc_check_files(destination_dir=pre_processed_dataset_dir,
-                                   n_samples_dict=n_samples_dict):
-            logger.info("Pre-processed dataset not found.")
-
-            # if the original Sorel20M dataset is not present, download it
-            if not download_check_files(dataset_dir):
-                logger.info("Dataset not found.")
-
-                # run dataset downloader
-                download_dataset_run = run("download_dataset", {
-                    'destination_dir': dataset_dir
-                }, config_sha=dataset_config_sha)
-
-            # pre-process dataset
-            preprocess_dataset_run = run("preprocess_dataset", {
-                'ds_path': dataset_base_path,
-                'destination_dir': pre_processed_dataset_dir,
-                'training_n_samples': training_n_samples,
-                'validation_n_samples': validation_n_samples,
-                'test_n_samples': test_n_samples,
-                'batch_size': batch_size,
-                'remove_missing_features': str(os.path.join(dataset_base_path, "shas_missing_ember_features.json"))
-            }, config_sha=dataset_config_sha)
+        mlflow.log_text(config_json, 'config.txt')
 
-        # if the fresh dataset is not present, generate it
-        if not fresh_check_files(fresh_dataset_dir):
-            logger.info("Fresh dataset not found.")
-
-            # generate fresh dataset
-            build_fresh_dataset_run = run("build_fresh_dataset", {
-                'dataset_dest_dir': fresh_dataset_dir
-            }, config_sha=fresh_dataset_config_sha)
+        # get dataset paths (downloading, pre-processing and building the datasets if they are not present)
+        dataset_dir, dataset_base_path, pre_processed_dataset_dir, fresh_dataset_dir = \
+            prepare_datasets(base_dir=base_dir,
+                             n_samples_dict=n_samples_dict,
+                             batch_size=batch_size,
+                             dataset_config_sha=dataset_config_sha,
+                             fresh_dataset_config_sha=fresh_dataset_config_sha,
+                             parallel_steps=parallel_steps)
 
         results_files = {}
         fresh_results_files = {}
         fresh_features_results_files = {}
 
-        # instantiate common (between consecutive training runs) training parameters
-        common_training_params = {
+        # instantiate common (between consecutive training runs) training parameters (read-only)
+        common_training_params = MappingProxyType({
             'ds_path': pre_processed_dataset_dir,
             'net_type': net_type,
             'gen_type': gen_type,
@@ -564,10 +732,10 @@ def detection_workflow(base_dir,  # base tool path
             'use_count_labels': use_count_labels,
             'use_tag_labels': use_tag_labels,
             'workers': workers
-        }
+        })
 
-        # instantiate common (between consecutive training runs) evaluation parameters
-        common_evaluation_params = {
+        # instantiate common (between consecutive training runs) evaluation parameters (read-only)
+        common_evaluation_params = MappingProxyType({
             'ds_path': pre_processed_dataset_dir,
             'net_type': net_type,
             'gen_type': gen_type,
@@ -575,124 +743,126 @@ def detection_workflow(base_dir,  # base tool path
             'test_n_samples': test_n_samples,
             'evaluate_malware': use_malicious_labels,
             'evaluate_count': use_count_labels
-        }
+        })
 
-        # for each training run
-        for training_run_id in range(runs):
-            logger.info("initiating training run n. {}".format(str(training_run_id)))
+        # instantiate common (between consecutive training runs) fresh dataset evaluation parameters (read-only)
+        common_fresh_eval_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'net_type': net_type,
+            'min_n_anchor_samples': min_n_anchor_samples,
+            'max_n_anchor_samples': max_n_anchor_samples,
+            'n_query_samples': fresh_n_queries,
+            'n_evaluations': n_evaluations
+        })
 
-            # set training parameters
-            training_params = common_training_params
-            training_params.update({'training_run': training_run_id})
+        # set model checkpoint file name (the same for all the training runs)
+        checkpoint_filename = "epoch_{}.pt".format(epochs)
 
-            # train network (get or run) on Sorel20M dataset
-            training_run = get_or_run("train_network",
-                                      training_params,
-                                      git_commit,
-                                      ignore_git=bool(ignore_git),
-                                      use_cache=bool(use_cache),
-                                      resume=True,
-                                      config_sha=config_sha)
+        def do_training_run(training_run_id):  # training run identifier
+            """ Execute (get or run) all the steps of a single training run.
 
-            # get model checkpoints path
-            checkpoint_path = parse.unquote(parse.urlparse(os.path.join(training_run.info.artifact_uri,
-                                                                        "model_checkpoints")).path)
+            Args:
+                training_run_id: Training run identifier
+            Returns:
+                Model evaluation results file.
+            """
 
-            # set model checkpoint filename
-            checkpoint_file = os.path.join(checkpoint_path, "epoch_{}.pt".format(epochs))
+            logger.info("initiating training run n. {}".format(str(training_run_id)))
 
-            # set evaluation parameters
-            evaluation_params = common_evaluation_params
-            evaluation_params.update({'checkpoint_file': checkpoint_file})
+            # set training parameters (copying the common ones)
+            training_params = {**common_training_params, 'training_run': training_run_id}
 
-            # evaluate model against Sorel20M dataset
-            evaluation_run = get_or_run("evaluate_network",
-                                        evaluation_params,
-                                        git_commit,
-                                        ignore_git=bool(ignore_git),
-                                        use_cache=bool(use_cache),
-                                        config_sha=config_sha)
+            # train network (get or run) on Sorel20M dataset
+            training_run = get_or_run_step("train_network",
+                                           training_params,
+                                           resume=True,
+                                           config_sha=config_sha)
 
-            # get model evaluation results path
-            results_path = parse.unquote(parse.urlparse(os.path.join(evaluation_run.info.artifact_uri,
-                                                                     "model_results")).path)
+            # get model checkpoint filename (inside the run artifacts)
+            checkpoint_file = get_artifact_path(training_run.info.artifact_uri,
+                                                "model_checkpoints",
+                                                checkpoint_filename)
 
-            # set model evaluation results filename
-            results_file = os.path.join(results_path, "results.csv")
+            # set evaluation parameters (copying the common ones)
+            evaluation_params = {**common_evaluation_params, 'checkpoint_file': checkpoint_file}
 
-            # add file path to results_files dictionary (used for plotting mean results)
-            results_files["run_id_" + str(training_run_id)] = results_file
+            # evaluate model against Sorel20M dataset
+            evaluation_run = get_or_run_step("evaluate_network",
+                                             evaluation_params,
+                                             config_sha=config_sha)
+
+            # get model evaluation results filename (inside the run artifacts)
+            results_file = get_artifact_path(evaluation_run.info.artifact_uri, "model_results", "results.csv")
 
             # compute (and plot) all tagging results
-            all_tagging_results_run = get_or_run("compute_all_run_results", {
+            all_tagging_results_run = get_or_run_step("compute_all_run_results", {
                 'results_file': results_file,
                 'use_malicious_labels': use_malicious_labels,
                 'use_tag_labels': use_tag_labels
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=config_sha)
+            }, config_sha=config_sha)
 
             # evaluate model against fresh dataset
-            fresh_evaluation_run = get_or_run("evaluate_fresh", {
-                'fresh_ds_path': fresh_dataset_dir,
-                'checkpoint_path': checkpoint_file,
-                'net_type': net_type,
-                'min_n_anchor_samples': min_n_anchor_samples,
-                'max_n_anchor_samples': max_n_anchor_samples,
-                'n_query_samples': fresh_n_queries,
-                'n_evaluations': n_evaluations
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=fresh_dataset_config_sha)
-
-            # get model evaluation results path
-            fresh_results_path = parse.unquote(parse.urlparse(os.path.join(fresh_evaluation_run.info.artifact_uri,
-                                                                           "fresh_prediction_results")).path)
+            fresh_evaluation_run = get_or_run_step("evaluate_fresh", {
+                **common_fresh_eval_params,
+                'checkpoint_path': checkpoint_file
+            }, config_sha=fresh_dataset_config_sha)
 
-            # set model evaluation results filename
-            fresh_results_file = os.path.join(fresh_results_path, "fresh_prediction_results.json")
+            # get model evaluation results filename (inside the run artifacts)
+            fresh_results_file = get_artifact_path(fresh_evaluation_run.info.artifact_uri,
+                                                   "fresh_prediction_results",
+                                                   "fresh_prediction_results.json")
 
             # compute (and plot) all family prediction results (on fresh dataset)
-            all_tagging_results_run = get_or_run("compute_all_run_fresh_results", {
+            all_tagging_results_run = get_or_run_step("compute_all_run_fresh_results", {
                 'results_file': fresh_results_file
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=fresh_dataset_config_sha)
-
-        # get overall parameters set (without duplicates and sorted)
-        params_set = [str(p) for p in common_training_params.values()]
-        params_set.extend([str(p) for p in common_evaluation_params.values() if str(p) not in params_set])
-        params_set.sort()
-
-        # instantiate hash
-        h = Hash()
-        # for each param in the parameters set, update the hash value
-        for param in params_set:
-            h.update(str(param))
-
-        # create temp dir name using the value from the hash object.
-        # -> This is done in order to have a different (but predictable) run_to_filename at each different run.
-        # This in turn means that mlflow knows when it is needed to run 'per_tag_plot_runs'.
-        tempdir = os.path.join(base_dir, 'tmp_{}'.format(h.get_b64()))
-        os.makedirs(tempdir, exist_ok=True)
-
-        # set run-to-filename file path
-        run_to_filename = os.path.join(tempdir, "results.json")
+            }, config_sha=fresh_dataset_config_sha)
 
-        # create and open the results.json file in write mode
-        with open(run_to_filename, "w") as output_file:
-            # save results_files dictionary as a json file
-            json.dump(results_files, output_file)
+            # return model evaluation results file
+            return results_file
 
-        # log run-to-filename
-        mlflow.log_artifact(run_to_filename, "run_to_filename")
+        # for each training run (executed concurrently if allowed)
+        for training_run_id, results_file in enumerate(execute_training_runs(do_training_run, runs, parallel_runs)):
+            # add file path to results_files dictionary (used for plotting mean results)
+            results_files["run_id_" + str(training_run_id)] = results_file
 
-        # if there is more than 1 run, compute also per-tag mean results
+        # if there is more than 1 run, compute also per-tag mean results (the run-to-filename json file is only needed
+        # by this run, so it is not created at all otherwise)
         if runs > 1:
-            # plot all roc distributions
-            per_tag_plot_runs = get_or_run("plot_all_roc_distributions", {
-                'run_to_filename_json': run_to_filename,
-                'use_malicious_labels': use_malicious_labels,
-                'use_tag_labels': use_tag_labels
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=config_sha)
-
-        # remove temporary directory and run_to_filename file
-        os.remove(run_to_filename)
-        os.rmdir(tempdir)
+            # get overall parameters set (sorted, without the evaluation parameters already among the training ones)
+            training_params_strs = [str(p) for p in common_training_params.values()]
+            # use a set for the membership tests (linear instead of quadratic), stringifying each value only once
+            training_params_strs_set = set(training_params_strs)
+            params_set = sorted(training_params_strs + [p for p in map(str, common_evaluation_params.values())
+                                                        if p not in training_params_strs_set])
+
+            # compute the parameters set digest with a single hash update over the concatenated parameters (same
+            # digest as updating the hash with each parameter in turn), updating it also with the results files paths
+            # of all the training runs (sorted by key, since the runs may complete in any order) so that new results
+            # never reuse a previously executed 'per_tag_plot_runs'
+            params_sha = Hash().update(''.join(params_set)).update(json.dumps(results_files, sort_keys=True)).get_b64()
+
+            # create temp dir name using the value of the parameters set and results files digest.
+            # -> This is done in order to have a different (but predictable) run_to_filename at each different run.
+            # This in turn means that mlflow knows when it is needed to run 'per_tag_plot_runs'.
+            tempdir = os.path.join(base_dir, 'tmp_{}'.format(params_sha))
+
+            # save results_files dictionary as a json file inside the temp dir (temp file and directory are removed on
+            # exit, even if some run fails)
+            with temp_json_file(tempdir, "results.json", results_files) as run_to_filename, ThreadPool(1) as log_pool:
+                # log run-to-filename in background, overlapping its upload with the plotting run
+                log_result = log_pool.apply_async(mlflow.log_artifact, (run_to_filename, "run_to_filename"))
+
+                try:
+                    # plot all roc distributions
+                    per_tag_plot_runs = get_or_run_step("plot_all_roc_distributions", {
+                        'run_to_filename_json': run_to_filename,
+                        'use_malicious_labels': use_malicious_labels,
+                        'use_tag_labels': use_tag_labels
+                    }, config_sha=config_sha)
+                finally:
+                    # wait for the run-to-filename upload to complete before the temp files are removed (even if some
+                    # plot run failed), re-raising any exception occurred while uploading
+                    log_result.get()
 
 
 @baker.command
@@ -709,6 +879,7 @@ def family_classifier_only(base_dir,  # base tool path
 
     # get some needed variables from config file
     runs = int(config['general']['runs'])
+    parallel_runs = int(config['general']['parallel_runs'])
     net_type = 'jointEmbedding'
 
     training_n_samples = int(config['sorel20mDataset']['training_n_samples'])
@@ -721,19 +892,11 @@ def family_classifier_only(base_dir,  # base tool path
     f_c_test_split_proportion = int(config['familyClassifier']['test_split_proportion'])
     f_c_batch_size = int(config['familyClassifier']['batch_size'])
 
-    # initialize Hash object
-    ch = Hash()
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items(net_type))))
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('freshDataset'))))
-    # get config file sha256 digest
-    fresh_eval_config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('familyClassifier'))))
-    # get config file sha256 digest
-    family_class_config_sha = ch.get_b64()
+    # get config file digests, each one computed (in a single pass) over the content of the config file sections
+    # it depends on: current net type + freshDataset
+    fresh_eval_config_sha = config_digest(net_type, 'freshDataset')
+    # current net type + freshDataset + familyClassifier
+    family_class_config_sha = config_digest(net_type, 'freshDataset', 'familyClassifier')
 
     # instantiate key-n_samples dict
     n_samples_dict = {'train': training_n_samples,
@@ -747,69 +910,69 @@ def family_classifier_only(base_dir,  # base tool path
     with mlflow.start_run() as active_run:
         # get code git commit version
         git_commit = active_run.data.tags.get(mlflow_tags.MLFLOW_GIT_COMMIT)
+        # bind get_or_run to the code git commit version and to the cache settings (shared by all the workflow steps)
+        get_or_run_step = partial(get_or_run,
+                                  git_commit=git_commit,
+                                  ignore_git=bool(ignore_git),
+                                  use_cache=bool(use_cache))
 
         # log config file
-        mlflow.log_text(json.dumps({s: dict(config.items(s)) for s in config.sections()}), 'config.txt')
+        mlflow.log_text(config_json, 'config.txt')
+
+        # get the fresh dataset dir, generating the fresh dataset if it is not present
+        fresh_dataset_dir = prepare_fresh_dataset(base_dir, fresh_eval_config_sha)
+
+        # instantiate common (between consecutive training runs) family classifier parameters (read-only)
+        common_f_c_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'train_split_proportion': f_c_train_split_proportion,
+            'valid_split_proportion': f_c_valid_split_proportion,
+            'test_split_proportion': f_c_test_split_proportion,
+            'batch_size': f_c_batch_size
+        })
 
-        # set dataset destination dir
-        dataset_dir = os.path.join(base_dir, 'dataset')
-        # set fresh dataset base path (directory containing .dat files)
-        fresh_dataset_dir = os.path.join(dataset_dir, 'fresh_dataset')
+        # set model checkpoint file name (the same for all the training runs)
+        f_c_checkpoint_filename = "epoch_{}.pt".format(f_c_epochs)
 
-        # if the fresh dataset is not present, generate it
-        if not fresh_check_files(fresh_dataset_dir):
-            logger.info("Fresh dataset not found.")
+        def do_training_run(training_run_id):  # training run identifier
+            """ Execute (get or run) all the steps of a single training run.
 
-            # generate fresh dataset
-            build_fresh_dataset_run = run("build_fresh_dataset", {
-                'dataset_dest_dir': fresh_dataset_dir
-            }, config_sha=fresh_eval_config_sha)
+            Args:
+                training_run_id: Training run identifier
+            """
 
-        # for each training run
-        for training_run_id in range(runs):
             logger.info("initiating training run n. {}".format(str(training_run_id)))
 
             # create family classifier from previously trained network and train it on fresh dataset
-            f_c_train_run = get_or_run("train_family_classifier", {
-                'fresh_ds_path': fresh_dataset_dir,
+            f_c_train_run = get_or_run_step("train_family_classifier", {
+                **common_f_c_params,
                 'epochs': f_c_epochs,
-                'training_run': training_run_id,
-                'train_split_proportion': f_c_train_split_proportion,
-                'valid_split_proportion': f_c_valid_split_proportion,
-                'test_split_proportion': f_c_test_split_proportion,
-                'batch_size': f_c_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
-
-            # get model checkpoints path
-            f_c_checkpoint_path = parse.unquote(parse.urlparse(os.path.join(f_c_train_run.info.artifact_uri,
-                                                                            "model_checkpoints")).path)
+                'training_run': training_run_id
+            }, config_sha=family_class_config_sha)
 
-            # set model checkpoint filename
-            f_c_checkpoint_file = os.path.join(f_c_checkpoint_path, "epoch_{}.pt".format(f_c_epochs))
+            # get model checkpoint filename (inside the run artifacts)
+            f_c_checkpoint_file = get_artifact_path(f_c_train_run.info.artifact_uri,
+                                                    "model_checkpoints",
+                                                    f_c_checkpoint_filename)
 
             # evaluate model against fresh dataset
-            f_c_eval_run = get_or_run("evaluate_family_classifier", {
-                'fresh_ds_path': fresh_dataset_dir,
+            f_c_eval_run = get_or_run_step("evaluate_family_classifier", {
+                **common_f_c_params,
                 'checkpoint_path': f_c_checkpoint_file,
-                'training_run': training_run_id,
-                'train_split_proportion': f_c_train_split_proportion,
-                'valid_split_proportion': f_c_valid_split_proportion,
-                'test_split_proportion': f_c_test_split_proportion,
-                'batch_size': f_c_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
-
-            # get model evaluation results path
-            f_c_results_path = parse.unquote(parse.urlparse(os.path.join(f_c_eval_run.info.artifact_uri,
-                                                                         "family_class_results")).path)
+                'training_run': training_run_id
+            }, config_sha=family_class_config_sha)
 
-            # set model evaluation results filename
-            f_c_results_file = os.path.join(f_c_results_path, "results.csv")
+            # get model evaluation results filename (inside the run artifacts)
+            f_c_results_file = get_artifact_path(f_c_eval_run.info.artifact_uri, "family_class_results", "results.csv")
 
             # compute (and plot) all tagging results
-            f_c_compute_results_run = get_or_run("compute_all_family_class_results", {
+            f_c_compute_results_run = get_or_run_step("compute_all_family_class_results", {
                 'results_file': f_c_results_file,
                 'fresh_ds_path': fresh_dataset_dir
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=family_class_config_sha)
+            }, config_sha=family_class_config_sha)
+
+        # execute all the training runs (concurrently if allowed)
+        execute_training_runs(do_training_run, runs, parallel_runs)
 
 
 @baker.command
@@ -826,6 +989,7 @@ def contrastive_learning_only(base_dir,  # base tool path
 
     # get some needed variables from config file
     runs = int(config['general']['runs'])
+    parallel_runs = int(config['general']['parallel_runs'])
     net_type = 'jointEmbedding'
 
     training_n_samples = int(config['sorel20mDataset']['training_n_samples'])
@@ -841,19 +1005,11 @@ def contrastive_learning_only(base_dir,  # base tool path
     c_l_knn_k_min = int(config['contrastiveLearning']['knn_k_min'])
     c_l_knn_k_max = int(config['contrastiveLearning']['knn_k_max'])
 
-    # initialize Hash object
-    ch = Hash()
-    # update hash with the content of the config file (for the current net type)
-    ch.update(json.dumps(dict(config.items(net_type))))
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('freshDataset'))))
-    # get config file sha256 digest
-    fresh_eval_config_sha = ch.get_b64()
-
-    # update hash with the content of the config file (for the freshDataset)
-    ch.update(json.dumps(dict(config.items('contrastiveLearning'))))
-    # get config file sha256 digest
-    contr_learn_config_sha = ch.get_b64()
+    # get config file digests, each one computed (in a single pass) over the content of the config file sections
+    # it depends on: current net type + freshDataset
+    fresh_eval_config_sha = config_digest(net_type, 'freshDataset')
+    # current net type + freshDataset + contrastiveLearning
+    contr_learn_config_sha = config_digest(net_type, 'freshDataset', 'contrastiveLearning')
 
     # Note: The entrypoint names are defined in MLproject. The artifact directories
     # are documented by each step's .py file.
@@ -862,116 +1018,121 @@ def contrastive_learning_only(base_dir,  # base tool path
     with mlflow.start_run() as active_run:
         # get code git commit version
         git_commit = active_run.data.tags.get(mlflow_tags.MLFLOW_GIT_COMMIT)
+        # bind get_or_run to the code git commit version and to the cache settings (shared by all the workflow steps)
+        get_or_run_step = partial(get_or_run,
+                                  git_commit=git_commit,
+                                  ignore_git=bool(ignore_git),
+                                  use_cache=bool(use_cache))
 
         # log config file
-        mlflow.log_text(json.dumps({s: dict(config.items(s)) for s in config.sections()}), 'config.txt')
+        mlflow.log_text(config_json, 'config.txt')
 
-        # set dataset destination dir
-        dataset_dir = os.path.join(base_dir, 'dataset')
-        # set fresh dataset base path (directory containing .dat files)
-        fresh_dataset_dir = os.path.join(dataset_dir, 'fresh_dataset')
+        # get the fresh dataset dir, generating the fresh dataset if it is not present
+        fresh_dataset_dir = prepare_fresh_dataset(base_dir, fresh_eval_config_sha)
 
-        # if the fresh dataset is not present, generate it
-        if not fresh_check_files(fresh_dataset_dir):
-            logger.info("Fresh dataset not found.")
+        c_l_results_files = {}
 
-            # generate fresh dataset
-            build_fresh_dataset_run = run("build_fresh_dataset", {
-                'dataset_dest_dir': fresh_dataset_dir
-            }, config_sha=fresh_eval_config_sha)
+        # instantiate common (between consecutive training runs) contrastive learning parameters (read-only)
+        common_c_l_params = MappingProxyType({
+            'fresh_ds_path': fresh_dataset_dir,
+            'train_split_proportion': c_l_train_split_proportion,
+            'valid_split_proportion': c_l_valid_split_proportion,
+            'test_split_proportion': c_l_test_split_proportion,
+            'batch_size': c_l_batch_size
+        })
 
-        c_l_results_files = {}
+        # set model checkpoint file name (the same for all the training runs)
+        c_l_checkpoint_filename = "epoch_{}.pt".format(c_l_epochs)
+
+        def do_training_run(training_run_id):  # training run identifier
+            """ Execute (get or run) all the steps of a single training run.
+
+            Args:
+                training_run_id: Training run identifier
+            Returns:
+                Contrastive learning scores dir path.
+            """
 
-        # for each training run
-        for training_run_id in range(runs):
             logger.info("initiating training run n. {}".format(str(training_run_id)))
 
             # create family classifier from previously trained network and train it on fresh dataset
-            c_l_train_run = get_or_run("train_contrastive_net", {
-                'fresh_ds_path': fresh_dataset_dir,
+            c_l_train_run = get_or_run_step("train_contrastive_net", {
+                **common_c_l_params,
                 'epochs': c_l_epochs,
-                'training_run': training_run_id,
-                'train_split_proportion': c_l_train_split_proportion,
-                'valid_split_proportion': c_l_valid_split_proportion,
-                'test_split_proportion': c_l_test_split_proportion,
-                'batch_size': c_l_batch_size
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
+                'training_run': training_run_id
+            }, config_sha=contr_learn_config_sha)
 
-            # get model checkpoints path
-            c_l_checkpoint_path = parse.unquote(parse.urlparse(os.path.join(c_l_train_run.info.artifact_uri,
-                                                                            "model_checkpoints")).path)
-
-            # set model checkpoint filename
-            c_l_checkpoint_file = os.path.join(c_l_checkpoint_path, "epoch_{}.pt".format(c_l_epochs))
+            # get model checkpoint filename (inside the run artifacts)
+            c_l_checkpoint_file = get_artifact_path(c_l_train_run.info.artifact_uri,
+                                                    "model_checkpoints",
+                                                    c_l_checkpoint_filename)
 
             # evaluate model against fresh dataset
-            c_l_eval_run = get_or_run("evaluate_contrastive_net", {
-                'fresh_ds_path': fresh_dataset_dir,
+            c_l_eval_run = get_or_run_step("evaluate_contrastive_net", {
+                **common_c_l_params,
                 'checkpoint_path': c_l_checkpoint_file,
                 'training_run': training_run_id,
-                'train_split_proportion': c_l_train_split_proportion,
-                'valid_split_proportion': c_l_valid_split_proportion,
-                'test_split_proportion': c_l_test_split_proportion,
-                'batch_size': c_l_batch_size,
                 'rank_size': c_l_rank_size,
                 'knn_k_min': c_l_knn_k_min,
                 'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-            # get model evaluation results path
-            c_l_results_path = parse.unquote(parse.urlparse(os.path.join(c_l_eval_run.info.artifact_uri,
-                                                                         "contrastive_learning_results")).path)
+            }, config_sha=contr_learn_config_sha)
 
-            # set model evaluation results filename
-            c_l_results_file = os.path.join(c_l_results_path, "results.csv")
+            # get model evaluation results filename (inside the run artifacts)
+            c_l_results_file = get_artifact_path(c_l_eval_run.info.artifact_uri,
+                                                 "contrastive_learning_results",
+                                                 "results.csv")
 
             # compute (and plot) all contrastive model results
-            c_l_compute_results_run = get_or_run("compute_contrastive_learning_results", {
+            c_l_compute_results_run = get_or_run_step("compute_contrastive_learning_results", {
                 'results_file': c_l_results_file,
                 'fresh_ds_path': fresh_dataset_dir,
                 'knn_k_min': c_l_knn_k_min,
                 'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
+            }, config_sha=contr_learn_config_sha)
 
             # get model evaluation results path
-            c_l_scores_dir_path = parse.unquote(parse.urlparse(os.path.join(c_l_compute_results_run.info.artifact_uri,
-                                                                            "contrastive_learning_scores")).path)
+            c_l_scores_dir_path = get_artifact_path(c_l_compute_results_run.info.artifact_uri,
+                                                    "contrastive_learning_scores")
+
+            # return contrastive learning scores dir path
+            return c_l_scores_dir_path
 
+        # for each training run (executed concurrently if allowed)
+        for training_run_id, c_l_scores_dir_path in enumerate(execute_training_runs(do_training_run,
+                                                                                    runs,
+                                                                                    parallel_runs)):
             # add dir path to c_l_results_files dictionary (used for plotting mean score trends)
             c_l_results_files["run_id_" + str(training_run_id)] = c_l_scores_dir_path
 
-        # create contrastive learning temp dir name using the value from config_sha (sha of some parts of the config
-        # file). -> This is done in order to have a different (but predictable) run_to_filename at each set of runs with
-        # different parameters. This allows mlflow to know when it is needed to run 'per_tag_plot_runs'. If, on the
-        # other hand a simple tempfile.TemporaryDirectory() was used then mlflow would run 'per_tag_plot_runs' every
-        # time, even if a precedent run was available (because the parameter 'run_to_filename_json' would be different)
-        c_l_tempdir = os.path.join(base_dir, 'tmp_{}'.format(contr_learn_config_sha))
-        # create temp dir
-        os.makedirs(c_l_tempdir, exist_ok=True)
-
-        # set run-to-filename file path
-        c_l_run_to_filename = os.path.join(c_l_tempdir, "c_l_results.json")
-
-        # create and open the c_l_results.json file in write mode
-        with open(c_l_run_to_filename, "w") as output_file:
-            # save c_l_results_files dictionary as a json file
-            json.dump(c_l_results_files, output_file)
-
-        mlflow.log_artifact(c_l_run_to_filename, "run_to_filename")
-
-        # if there is more than 1 run, compute also the model mean scores trends
+        # if there is more than 1 run, compute also the model mean scores trends (the run-to-filename json file is only
+        # needed by this run, so it is not created at all otherwise)
         if runs > 1:
-            # plot all model mean scores trends
-            plot_all_scores_trends = get_or_run("plot_all_scores_trends", {
-                'run_to_filename_json': c_l_run_to_filename,
-                'knn_k_min': c_l_knn_k_min,
-                'knn_k_max': c_l_knn_k_max
-            }, git_commit, ignore_git=bool(ignore_git), use_cache=bool(use_cache), config_sha=contr_learn_config_sha)
-
-        # remove contrastive learning temp files and temporary directory
-        os.remove(c_l_run_to_filename)
-        # os.remove(fresh_run_to_filename)
-        os.rmdir(c_l_tempdir)
+            # create contrastive learning temp dir name using the value from config_sha (sha of some parts of the
+            # config file). -> This is done in order to have a different (but predictable) run_to_filename at each set
+            # of runs with different parameters. This allows mlflow to know when it is needed to run
+            # 'plot_all_scores_trends'. If, on the other hand a simple tempfile.TemporaryDirectory() was used then
+            # mlflow would run 'plot_all_scores_trends' every time, even if a precedent run was available (because the
+            # parameter 'run_to_filename_json' would be different)
+            c_l_tempdir = os.path.join(base_dir, 'tmp_{}'.format(contr_learn_config_sha))
+
+            # save c_l_results_files dictionary as a json file inside the temp dir (temp file and directory are removed
+            # on exit, even if some run fails)
+            with temp_json_file(c_l_tempdir, "c_l_results.json", c_l_results_files) as c_l_run_to_filename, \
+                    ThreadPool(1) as log_pool:
+                # log run-to-filename in background, overlapping its upload with the plotting run
+                log_result = log_pool.apply_async(mlflow.log_artifact, (c_l_run_to_filename, "run_to_filename"))
+
+                try:
+                    # plot all model mean scores trends
+                    plot_all_scores_trends = get_or_run_step("plot_all_scores_trends", {
+                        'run_to_filename_json': c_l_run_to_filename,
+                        'knn_k_min': c_l_knn_k_min,
+                        'knn_k_max': c_l_knn_k_max
+                    }, config_sha=contr_learn_config_sha)
+                finally:
+                    # wait for the run-to-filename upload to complete before the temp files are removed (even if some
+                    # plot run failed), re-raising any exception occurred while uploading
+                    log_result.get()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,10 @@
 import base64  # provides functions for encoding/decoding binary data to/from printable ASCII characters
 import hashlib  # implements a common interface to many different secure hash and message digest algorithms
+import json  # json encoder and decoder
+import os  # provides a portable way of using operating system dependent functionality
+from contextlib import contextmanager  # utilities for common tasks involving the with statement
+from functools import lru_cache  # decorator to wrap a function with a memoizing callable
+from urllib import parse  # standard interface to break Uniform Resource Locator (URL) in components
 
 import mlflow  # open source platform for managing the end-to-end machine learning lifecycle
 from logzero import logger  # robust and effective logging for Python
@@ -7,10 +12,40 @@ from mlflow.entities import RunStatus  # status of a Run
 from mlflow.tracking.fluent import _get_experiment_id  # get current experiment id function
 from mlflow.utils import mlflow_tags  # mlflow tags
 
+# MLflowClient instance shared by all the run lookups and launches of this process (lazily instantiated)
+_client = None
+
+# number of runs fetched from the tracking server per search request (the most recent runs are fetched first and the
+# next page is only requested if no matching run was found in the previous ones)
+_search_page_size = 100
+
+# string representation of the FINISHED run status (as stored in the run info)
+_finished_status = RunStatus.to_string(RunStatus.FINISHED)
+
+
+def _get_client():
+    """ Get the MLflowClient instance shared by this process, instantiating it the first time.
+
+    Returns:
+        MLflowClient instance (creates and manages experiments and runs).
+    """
+
+    global _client
+
+    # if the client was not instantiated yet, instantiate it (the tracking uri does not change within the process)
+    if _client is None:
+        _client = mlflow.tracking.MlflowClient()
+
+    # return client
+    return _client
+
 
 class Hash:
     """ Simple wrapper around hashlib sha256 functions. """
 
+    # the only instance attribute is the underlying hashlib object (no per-instance __dict__ is needed)
+    __slots__ = ('m',)
+
     def __init__(self):
         """ Initialize hash class using hashlib sha256 implementation. """
 
@@ -18,15 +53,19 @@ class Hash:
         self.m = hashlib.sha256()
 
     def update(self,
-               w):  # string to update hash value with
+               w):  # string (or bytes-like object) to update hash value with
         """ Update current hash value.
 
         Args:
-            w: String to update hash value with
+            w: String (or bytes-like object, e.g. bytes or memoryview) to update hash value with
+        Returns:
+            The Hash instance itself (to allow chaining calls).
         """
 
-        # update current hash with w
-        self.m.update(w.encode('utf-8'))
+        # update current hash with w (encoding it only if it is a string, bytes-like objects are hashed in place)
+        self.m.update(w.encode('utf-8') if isinstance(w, str) else w)
+        # return the instance itself
+        return self
 
     def copy(self):
         """ Return a copy of the Hash object
@@ -52,10 +91,107 @@ class Hash:
         return base64.urlsafe_b64encode(self.m.digest()).decode('utf-8')
 
 
+@lru_cache(maxsize=512)
+def get_artifact_path(artifact_uri,  # artifact uri of the run
+                      *artifact_names):  # name (relative path) components of the artifact
+    """ Get (memoized) local path of a run artifact given the run artifact uri.
+
+    Args:
+        artifact_uri: Artifact uri of the run
+        artifact_names: Name (relative path) components of the artifact (e.g. artifact dir and file name)
+    Returns:
+        Local path of the artifact.
+    """
+
+    # get the path component of the artifact uri: for local file uris (without host) it is simply the part after the
+    # scheme, otherwise fall back to the full url parsing
+    if artifact_uri.startswith('file:///'):
+        artifact_dir = artifact_uri[len('file://'):]
+    else:
+        artifact_dir = parse.urlparse(artifact_uri).path
+
+    # decode percent-encoded characters (if any) of the path
+    if '%' in artifact_dir:
+        artifact_dir = parse.unquote(artifact_dir)
+
+    # return artifact path
+    return os.path.join(artifact_dir, *artifact_names)
+
+
+@contextmanager
+def temp_json_file(tempdir,  # path of the (predictable) temporary directory where to create the file
+                   filename,  # name of the json file to create
+                   content):  # json serializable object to save in the file
+    """ Context manager creating a json file inside a temporary directory with a predictable path and removing both of
+    them on exit (even if an exception is raised).
+
+    Args:
+        tempdir: Path of the (predictable) temporary directory where to create the file
+        filename: Name of the json file to create
+        content: Json serializable object to save in the file
+    Yields:
+        The json file path.
+    """
+
+    # create temp dir
+    os.makedirs(tempdir, exist_ok=True)
+
+    # set json file path
+    file_path = os.path.join(tempdir, filename)
+
+    try:
+        # create and open the json file in write mode
+        with open(file_path, "w") as output_file:
+            # save content as a json file (serializing it in one go with the C encoder and writing it with a single
+            # call, instead of the many small chunk writes done by json.dump)
+            output_file.write(json.dumps(content))
+
+        yield file_path
+    finally:
+        # remove temp file (if it was created) and temporary directory
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        os.rmdir(tempdir)
+
+
+def _search_runs(client,  # MLflowClient instance
+                 experiment_id,  # experiment id
+                 filter_string):  # search filter string
+    """ Search (server-side) the runs of an experiment matching a filter string, from the most recent to the oldest one.
+    Runs are fetched lazily in bounded pages, so the next page is only requested if the caller keeps iterating.
+
+    Args:
+        client: MLflowClient instance
+        experiment_id: Experiment id
+        filter_string: Search filter string
+    Yields:
+        Matching runs (including their data: tags, params and metrics).
+    """
+
+    page_token = None
+    # for each page of search results
+    while True:
+        # get next page of matching runs (most recent first)
+        runs_page = client.search_runs([experiment_id],
+                                       filter_string=filter_string,
+                                       max_results=_search_page_size,
+                                       order_by=['attributes.start_time DESC'],
+                                       page_token=page_token)
+
+        # yield all the page runs
+        for found_run in runs_page:
+            yield found_run
+
+        # get next page token; if there are no more pages stop
+        page_token = runs_page.token
+        if not page_token:
+            break
+
+
 def _already_ran(entry_point_name,  # entry point name of the run
                  parameters,  # parameters of the run
                  git_commit,  # git version of the code run
-                 config_sha,  # sha256 of config file
+                 config_sha,  # digest of config file
                  ignore_git=False,  # whether to ignore git version or not (default: False)
                  experiment_id=None,  # experiment id (default: None)
                  resume=False):  # whether to resume a failed/killed previous run or not (default: False)
@@ -66,7 +202,7 @@ def _already_ran(entry_point_name,  # entry point name of the run
         entry_point_name: Entry point name of the run
         parameters: Parameters of the run
         git_commit: Git version of the code run
-        config_sha: Sha256 of config file
+        config_sha: Digest of config file
         ignore_git: Whether to ignore git version or not (default: False)
         experiment_id: Experiment id (default: None)
         resume: Whether to resume a failed/killed previous run (only for training) or not (default: False)
@@ -76,35 +212,49 @@ def _already_ran(entry_point_name,  # entry point name of the run
 
     # if experiment ID is not provided retrieve current experiment ID
     experiment_id = experiment_id if experiment_id is not None else _get_experiment_id()
-    # instantiate MLflowClient (creates and manages experiments and runs)
-    client = mlflow.tracking.MlflowClient()
-    # get reversed list of run information (from last to first)
-    all_run_infos = reversed(client.list_run_infos(experiment_id))
+    # get shared MLflowClient (creates and manages experiments and runs)
+    client = _get_client()
+
+    # build search filter string selecting (server-side) only the runs with the given entry point and config file
+    # digest and, if the git version is not ignored, with the same git version
+    filter_string = "tags.`{}` = '{}' and params.`config_sha` = '{}'".format(mlflow_tags.MLFLOW_PROJECT_ENTRY_POINT,
+                                                                            entry_point_name,
+                                                                            config_sha)
+    if not ignore_git and git_commit is not None:
+        filter_string += " and tags.`{}` = '{}'".format(mlflow_tags.MLFLOW_GIT_COMMIT, git_commit)
+
+    # stringify the provided run parameters values once (run parameters are stored as strings)
+    expected_params = {param_key: str(param_value) for param_key, param_value in parameters.items()}
+
+    # push down to the search also the run parameters (skipping the ones whose value contains a quote or a backslash,
+    # which would break the filter string since backslashes are treated as escape characters by the filter parser;
+    # those are still checked client-side below)
+    for param_key, param_value in expected_params.items():
+        if "'" not in param_value and '\\' not in param_value and '`' not in param_key:
+            filter_string += " and params.`{}` = '{}'".format(param_key, param_value)
+
+    # if stopped runs are not going to be resumed, only finished runs are of interest -> the first run returned by the
+    # search (the most recent one) is the searched one
+    if not resume:
+        filter_string += " and attributes.status = '{}'".format(_finished_status)
 
     run_to_resume_id = None
 
-    # for all runs info
-    for run_info in all_run_infos:
-        # fetch run from backend store
-        full_run = client.get_run(run_info.run_id)
+    # for all the candidate runs (from the most recent to the oldest one, already carrying their tags and params)
+    for full_run in _search_runs(client, experiment_id, filter_string):
+        # get run info
+        run_info = full_run.info
         # get run dictionary of tags
         tags = full_run.data.tags
         # if there is no entry point, or the entry point for the run is different from 'entry_point_name', continue
         if tags.get(mlflow_tags.MLFLOW_PROJECT_ENTRY_POINT, None) != entry_point_name:
             continue
 
-        # initialize 'match_failed' bool to false
-        match_failed = False
-        # for each parameter in the provided run parameters
-        for param_key, param_value in parameters.items():
-            # get run param value from the run dictionary of parameters
-            run_value = full_run.data.params.get(param_key)
-            # if the current parameter value is different from the run parameter set 'match_failed' to true and break
-            if str(run_value) != str(param_value):
-                match_failed = True
-                break
-        # if the current run is not the one we are searching for go to the next one
-        if match_failed:
+        # get run dictionary of parameters
+        run_params = full_run.data.params
+        # if at least one of the provided run parameters is different from the run one (or missing), the current run
+        # is not the one we are searching for -> go to the next one
+        if any(run_params.get(param_key) != param_value for param_key, param_value in expected_params.items()):
             continue
 
         # get previous run git commit version
@@ -115,19 +265,21 @@ def _already_ran(entry_point_name,  # entry point name of the run
                            .format(previous_version, git_commit))
             continue
 
-        # get config file sha256 from the run
-        run_config_sha = full_run.data.params.get('config_sha')
-        # if the config file sha256 for the run is different from the current sha, go to the next one
-        if str(run_config_sha) != str(config_sha):
+        # get config file digest from the run
+        run_config_sha = run_params.get('config_sha')
+        # if the config file digest for the run is different from the current sha, go to the next one
+        if run_config_sha != config_sha:
             logger.warning("Run matched, but config is different.")
             continue
 
-        # if the run is not finished
-        if run_info.to_proto().status != RunStatus.FINISHED:
+        # if the run is not finished (comparing the run info status string directly, without serializing the run info
+        # to protobuf)
+        if run_info.status != _finished_status:
             if resume:
-                # if resume is enabled, set current run to resume id -> if no newer completed run is found,
-                # this stopped run will be resumed
-                run_to_resume_id = run_info.run_id
+                # if resume is enabled and no more recent stopped run was found, set current run to resume id -> if no
+                # completed run is found, this stopped run will be resumed
+                if run_to_resume_id is None:
+                    run_to_resume_id = run_info.run_id
                 continue
             else:  # otherwise skip it and try with the next one
                 logger.warning("Run matched, but is not FINISHED, so skipping " "(run_id={}, status={})"
@@ -135,7 +287,7 @@ def _already_ran(entry_point_name,  # entry point name of the run
                 continue
 
         # otherwise (if the run was found and it is exactly the same), return the found run
-        return client.get_run(run_info.run_id)
+        return full_run
 
     # if no previously executed (and finished) run was found but a stopped run was found, resume such run
     if run_to_resume_id is not None:
@@ -147,11 +299,11 @@ def _already_ran(entry_point_name,  # entry point name of the run
         # submit new run that will resume the previously interrupted one
         submitted_run = mlflow.run(".", entry_point_name, parameters=parameters)
 
-        # log config file sha256 as parameter in the submitted run
+        # log config file digest as parameter in the submitted run
         client.log_param(submitted_run.run_id, 'config_sha', config_sha)
 
         # return submitted (new) run
-        return mlflow.tracking.MlflowClient().get_run(submitted_run.run_id)
+        return client.get_run(submitted_run.run_id)
 
     # if the searched run was not found return 'None'
     logger.warning("No matching run has been found.")
@@ -160,25 +312,25 @@ def _already_ran(entry_point_name,  # entry point name of the run
 
 def run(entrypoint,  # entrypoint of the run
         parameters,  # parameters of the run
-        config_sha):  # sha256 of config file
+        config_sha):  # digest of config file
     """ Launch run.
 
     Args:
         entrypoint: Entrypoint of the run
         parameters: Parameters of the run
-        config_sha: Sha256 of config file
+        config_sha: Digest of config file
     Returns:
         Launched run.
     """
 
-    # get mlflow tracking client
-    client = mlflow.tracking.MlflowClient()
+    # get shared mlflow tracking client
+    client = _get_client()
 
     logger.info("Launching new run for entrypoint={} and parameters={}".format(entrypoint, parameters))
     # submit (start) run
     submitted_run = mlflow.run(".", entrypoint, parameters=parameters)
 
-    # log config file sha256 as parameter in the submitted run
+    # log config file digest as parameter in the submitted run
     client.log_param(submitted_run.run_id, 'config_sha', config_sha)
 
     # return run
@@ -188,7 +340,7 @@ def run(entrypoint,  # entrypoint of the run
 def get_or_run(entrypoint,  # entrypoint of the run
                parameters,  # parameters of the run
                git_commit,  # git version of the run
-               config_sha,  # sha256 of config file
+               config_sha,  # digest of config file
                ignore_git=False,  # whether to ignore git version or not (default: False)
                use_cache=True,  # whether to cache previous runs or not (default: True)
                resume=False):  # whether to resume a failed/killed previous run or not (default: False)
@@ -198,7 +350,7 @@ def get_or_run(entrypoint,  # entrypoint of the run
         entrypoint: Entrypoint of the run
         parameters: Parameters of the run
         git_commit: Git version of the run
-        config_sha: Sha256 of config file
+        config_sha: Digest of config file
         ignore_git: Whether to ignore git version or not (default: False)
         use_cache: Whether to cache previous runs or not (default: True)
         resume: Whether to resume a failed/killed previous run or not (default: False)
@@ -206,9 +358,11 @@ def get_or_run(entrypoint,  # entrypoint of the run
         Found or launched run.
     """
 
-    # get already executed run, if it exists
+    # get already executed run, if it exists (searching for it only if it could be used, i.e. if we want to cache
+    # previous runs, or if a stopped run may have to be resumed)
     existing_run = _already_ran(entrypoint, parameters, git_commit,
-                                ignore_git=ignore_git, resume=resume, config_sha=config_sha)
+                                ignore_git=ignore_git, resume=resume, config_sha=config_sha) \
+        if use_cache or resume else None
     # if we want to cache previous runs and we found a previously executed run, return found run
     if use_cache and existing_run:
         logger.info("Found existing run for entrypoint={} and parameters={}".format(entrypoint, parameters))